@@ -0,0 +1,292 @@
+"""In-memory bitmap index of broadcast audiences.
+
+Every user is one bit (position = users.id) in Python int bitmaps: active,
+registered, one bitmap per time zone, per meeting registration and per
+meeting answer. Audiences and counts are set operations on these ints.
+The index is built from SQLite at startup and kept current by the
+repository write paths after they commit.
+"""
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Positions of set bits in every byte value, for fast bitmap -> ids conversion
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def bitmap_ids(bitmap: int) -> List[int]:
+    """Positions of set bits in ascending order"""
+    ids = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for offset, value in enumerate(data):
+        if value:
+            base = offset * 8
+            ids.extend(base + bit for bit in _BYTE_BITS[value])
+    return ids
+
+
+def bitmap_of(ids: Iterable[int]) -> int:
+    """Bitmap with given positions set, built in one pass over a bytearray"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for position in ids:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _journaled(method):
+    """Apply write under the index lock, log it while a check rebuilds the index
+    and pass it on to the index that replaced this one"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            method(self, *args, **kwargs)
+            if self._journal is not None:
+                self._journal.append((method.__name__, args, kwargs))
+            successor = self._successor
+        if successor is not None:
+            getattr(successor, method.__name__)(*args, **kwargs)
+    return wrapper
+
+
+class AudienceIndex:
+    """Bitmaps over user ids for audience segments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Writes seen while a check builds a fresh index, replayed onto it before the swap
+        self._journal: Optional[List[tuple]] = None
+        # Fresh index that replaced this one; writers still holding this one are forwarded
+        self._successor: Optional['AudienceIndex'] = None
+        # users.id <-> tg_id
+        self.tg_ids: Dict[int, int] = {}
+        self.user_ids: Dict[int, int] = {}
+        self.active = 0
+        self.registered = 0
+        # Time zone (None = bot time zone) -> users
+        self.timezones: Dict[Optional[str], int] = {}
+        # Meeting date -> users registered (not waitlisted or cancelled)
+        self.meetings: Dict[str, int] = {}
+        # (meeting date, response) -> users whose latest answer it is
+        self.responses: Dict[Tuple[str, str], int] = {}
+
+    @classmethod
+    def build(cls, db_path: Path) -> 'AudienceIndex':
+        """Build index from the database"""
+        index = cls()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        # One read transaction, so all bitmaps describe the same moment
+        cursor.execute("BEGIN")
+
+        # Ids are collected first and every bitmap is built once:
+        # OR-ing bits into a growing int copies the whole int every time
+        active, registered = [], []
+        timezones: Dict[Optional[str], List[int]] = {}
+        cursor.execute("SELECT id, tg_id, is_active, is_registered, timezone FROM users")
+        for user_id, tg_id, is_active, is_registered, timezone in cursor:
+            index.tg_ids[user_id] = tg_id
+            index.user_ids[tg_id] = user_id
+            if is_active:
+                active.append(user_id)
+            if is_registered:
+                registered.append(user_id)
+            timezones.setdefault(timezone, []).append(user_id)
+
+        meetings: Dict[str, List[int]] = {}
+        cursor.execute("SELECT user_id, meeting_date FROM registrations WHERE status = 'registered'")
+        for user_id, meeting_date in cursor:
+            meetings.setdefault(meeting_date, []).append(user_id)
+
+        # Latest answer per user and meeting (bare column of the MAX(id) row)
+        responses: Dict[Tuple[str, str], List[int]] = {}
+        cursor.execute("""
+            SELECT user_id, meeting_date, response, MAX(id) FROM responses
+            GROUP BY meeting_date, user_id
+        """)
+        for user_id, meeting_date, response, _ in cursor:
+            responses.setdefault((meeting_date, response), []).append(user_id)
+
+        conn.rollback()
+        conn.close()
+
+        index.active = bitmap_of(active)
+        index.registered = bitmap_of(registered)
+        index.timezones = {timezone: bitmap_of(ids) for timezone, ids in timezones.items()}
+        index.meetings = {meeting_date: bitmap_of(ids) for meeting_date, ids in meetings.items()}
+        index.responses = {key: bitmap_of(ids) for key, ids in responses.items()}
+        return index
+
+    @_journaled
+    def set_user(self, tg_id: int, user_id: int = None, **fields):
+        """Apply new values of is_active, is_registered or timezone; user_id is needed for new users"""
+        user_id = user_id if user_id is not None else self.user_ids.get(tg_id)
+        if user_id is None:
+            return
+        bit = 1 << user_id
+        if user_id not in self.tg_ids:
+            self.tg_ids[user_id] = tg_id
+            self.user_ids[tg_id] = user_id
+            self.timezones[None] = self.timezones.get(None, 0) | bit
+
+        if 'is_active' in fields:
+            self.active = self.active | bit if fields['is_active'] else self.active & ~bit
+        if 'is_registered' in fields:
+            self.registered = self.registered | bit if fields['is_registered'] else self.registered & ~bit
+        if 'timezone' in fields:
+            for timezone in self.timezones:
+                self.timezones[timezone] &= ~bit
+            self.timezones[fields['timezone']] = self.timezones.get(fields['timezone'], 0) | bit
+
+    @_journaled
+    def deactivate(self, tg_ids: List[int]):
+        """Mark users inactive"""
+        mask = 0
+        for tg_id in tg_ids:
+            user_id = self.user_ids.get(tg_id)
+            if user_id is not None:
+                mask |= 1 << user_id
+        self.active &= ~mask
+
+    @_journaled
+    def set_registration(self, meeting_date: str, registered: bool, user_id: int = None, tg_id: int = None):
+        """Add or remove user from meeting registrations"""
+        user_id = user_id if user_id is not None else self.user_ids.get(tg_id)
+        if user_id is None:
+            return
+        bit = 1 << user_id
+        bitmap = self.meetings.get(meeting_date, 0)
+        self.meetings[meeting_date] = bitmap | bit if registered else bitmap & ~bit
+
+    @_journaled
+    def drop_meetings_before(self, before_date: str):
+        """Forget registrations of archived meetings"""
+        for meeting_date in [date for date in self.meetings if date < before_date]:
+            del self.meetings[meeting_date]
+
+    @_journaled
+    def set_responses(self, answers: List[Tuple[int, str, str]]):
+        """Apply answers (tg_id, meeting_date, response) in the order they were given"""
+        for tg_id, meeting_date, response in answers:
+            user_id = self.user_ids.get(tg_id)
+            if user_id is None:
+                continue
+            bit = 1 << user_id
+            for key in self.responses:
+                if key[0] == meeting_date:
+                    self.responses[key] &= ~bit
+            key = (meeting_date, response)
+            self.responses[key] = self.responses.get(key, 0) | bit
+
+    def audience(self, timezone: Optional[str] = None, include_unset: bool = False) -> int:
+        """Active registered users, optionally of one time zone bucket"""
+        bitmap = self.active & self.registered
+        if timezone is None and not include_unset:
+            return bitmap
+        bucket = self.timezones.get(timezone, 0) if timezone is not None else 0
+        if include_unset:
+            bucket |= self.timezones.get(None, 0)
+        return bitmap & bucket
+
+    def responded(self, meeting_date: str, response: str) -> int:
+        """Active registered users whose latest answer for the meeting is `response`"""
+        return self.active & self.registered & self.responses.get((meeting_date, response), 0)
+
+    def with_registrations(self) -> int:
+        """Users registered for at least one meeting"""
+        bitmap = 0
+        for meeting_bitmap in self.meetings.values():
+            bitmap |= meeting_bitmap
+        return bitmap
+
+    def tg_ids_of(self, bitmap: int) -> List[int]:
+        """Telegram ids of users in bitmap"""
+        return [self.tg_ids[user_id] for user_id in bitmap_ids(bitmap)]
+
+    def compare(self, other: 'AudienceIndex') -> Dict[str, int]:
+        """Count users that differ per bitmap; empty dict if indexes agree"""
+        pairs = {
+            'active': (self.active, other.active),
+            'registered': (self.registered, other.registered),
+            'users': (bitmap_of(self.tg_ids), bitmap_of(other.tg_ids)),
+        }
+        for name, mine, theirs in (('timezone', self.timezones, other.timezones),
+                                   ('meeting', self.meetings, other.meetings),
+                                   ('response', self.responses, other.responses)):
+            for key in mine.keys() | theirs.keys():
+                pairs[f"{name}:{key}"] = (mine.get(key, 0), theirs.get(key, 0))
+        differences = {name: (mine ^ theirs).bit_count() for name, (mine, theirs) in pairs.items()}
+        return {name: count for name, count in differences.items() if count}
+
+
+# Database path -> index
+_indexes: Dict[Path, AudienceIndex] = {}
+
+
+def load_audience_index(db_path: Path) -> AudienceIndex:
+    """Build index of a database and start keeping it current"""
+    started_at = time.monotonic()
+    index = _indexes[db_path] = AudienceIndex.build(db_path)
+    logger.info(f"Audience index built for {db_path.name}: {len(index.tg_ids)} users "
+                f"in {(time.monotonic() - started_at) * 1000:.0f} ms")
+    return index
+
+
+def get_audience_index(db_path: Path) -> Optional[AudienceIndex]:
+    """Loaded index of a database, None if it is not indexed (queries go to SQLite)"""
+    return _indexes.get(db_path)
+
+
+def check_audience_index(db_path: Path) -> Dict[str, int]:
+    """Compare loaded index with the database and rebuild it on mismatch; return differences"""
+    index = _indexes.get(db_path)
+    if index is None:
+        return {}
+
+    with index._lock:
+        index._journal = []
+    try:
+        fresh = AudienceIndex.build(db_path)
+        with index._lock:
+            # Writes applied while the build ran may be missing from its snapshot
+            for name, args, kwargs in index._journal:
+                getattr(fresh, name)(*args, **kwargs)
+            differences = index.compare(fresh)
+            if differences:
+                # Writes that bypass the repositories (bulk import, manual SQL) or were rolled back end up here
+                logger.warning(f"Audience index of {db_path.name} is out of date, replaced by a fresh build",
+                               extra={'differences': differences})
+                index._successor = fresh
+                _indexes[db_path] = fresh
+    finally:
+        index._journal = None
+    return differences
+
+
+# Databases with a check queued by schedule_audience_check
+_checks_scheduled: Set[Path] = set()
+
+
+def schedule_audience_check(db_path: Path):
+    """Check index in a worker thread, e.g. after writes it has already seen were rolled back"""
+    if db_path not in _indexes or db_path in _checks_scheduled:
+        return
+    _checks_scheduled.add(db_path)
+
+    def run():
+        try:
+            check_audience_index(db_path)
+        except Exception as e:
+            logger.error(f"Audience index check of {db_path.name} failed: {e}")
+        finally:
+            _checks_scheduled.discard(db_path)
+
+    threading.Thread(target=run, name='audience-check', daemon=True).start()
@@ -1,18 +1,176 @@
 """Database models and initialization"""
+import asyncio
+import json
+import logging
 import sqlite3
+import threading
+import time
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Optional, List
-from datetime import datetime
+from typing import Optional, List, Tuple
+from datetime import datetime, timedelta
+from config import current_tenant
+from bot.data.audience import AudienceIndex, get_audience_index, schedule_audience_check
+
+logger = logging.getLogger(__name__)
 
 # Database path
 DB_PATH = Path(__file__).parent / "db.sqlite3"
 
 
-def init_db():
+def current_db_path() -> Path:
+    """Database of the current tenant"""
+    return current_tenant.get().db_path or DB_PATH
+
+
+def _audience(db_path: Path = None) -> Optional[AudienceIndex]:
+    """Loaded audience index of the database (None = current tenant's), kept current after commits"""
+    return get_audience_index(db_path or current_db_path())
+
+
+class UnitOfWork:
+    """One connection and one transaction shared by the repository calls of an update.
+    
+    Repositories borrow the connection instead of opening their own, their
+    commit and close calls are deferred until the unit commits. Only the task
+    that opened the unit takes part: worker threads and tasks spawned from a
+    handler keep their own connections.
+    """
+    
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.task = asyncio.current_task()
+        self.commits = 0
+        self.closed = False
+        self._conn = None
+    
+    def connection(self) -> '_BorrowedConnection':
+        """Connection of the unit, opened on first use"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path)
+        return _BorrowedConnection(self._conn)
+    
+    @property
+    def pending(self) -> bool:
+        """Whether a transaction is open"""
+        return self._conn is not None and self._conn.in_transaction
+    
+    def commit(self):
+        """Commit changes made so far"""
+        if self.pending:
+            self._conn.commit()
+            self.commits += 1
+    
+    def rollback(self):
+        """Discard uncommitted changes"""
+        if self.pending:
+            self._conn.rollback()
+            # Index hooks of the discarded writes have already run, rebuild off the event loop
+            schedule_audience_check(self.db_path)
+    
+    def close(self):
+        """Close connection; later calls open their own connections again"""
+        self.closed = True
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class _BorrowedConnection:
+    """Connection of a unit of work as seen by a repository method"""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+    
+    def cursor(self) -> '_BorrowedCursor':
+        return _BorrowedCursor(self._conn)
+    
+    def commit(self):
+        # Deferred to the unit of work
+        pass
+    
+    def close(self):
+        pass
+    
+    def rollback(self):
+        self._conn.rollback()
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _BorrowedCursor:
+    """Cursor on a borrowed connection"""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self._cursor = conn.cursor()
+    
+    def execute(self, sql: str, parameters=()):
+        if sql.lstrip()[:5].upper() == 'BEGIN' and self._conn.in_transaction:
+            # Explicit transaction of a repository method (e.g. BEGIN IMMEDIATE for seat
+            # counters): commit earlier changes, so its rollback only discards its own
+            self._conn.commit()
+        self._cursor.execute(sql, parameters)
+        return self
+    
+    def executemany(self, sql: str, seq_of_parameters):
+        self._cursor.executemany(sql, seq_of_parameters)
+        return self
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# Unit of work of the update being handled, see bot/middlewares/unit_of_work.py
+current_unit: ContextVar[Optional[UnitOfWork]] = ContextVar('current_unit', default=None)
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    """Open unit of work of the running task, None outside of one"""
+    unit = current_unit.get()
+    if unit is None or unit.closed:
+        return None
+    try:
+        if asyncio.current_task() is not unit.task:
+            return None
+    except RuntimeError:
+        # Worker thread without event loop
+        return None
+    return unit
+
+
+def _connect(db_path: Path):
+    """Connection of the current unit of work if it is on db_path, otherwise a new connection"""
+    unit = current_unit_of_work()
+    if unit is not None and unit.db_path == db_path:
+        return unit.connection()
+    return sqlite3.connect(db_path)
+
+
+# Set by init_db: False if SQLite is built without FTS5 and search falls back to LIKE
+USER_SEARCH_FTS = False
+
+
+def init_db(db_path: Path = DB_PATH):
     """Initialize database and create tables if not exist"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
+    # Pages freed by retention are returned to the OS in small steps by incremental_vacuum.
+    # Files created without it need one full VACUUM to switch.
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] != 2:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+        logger.info("Database switched to incremental auto-vacuum")
+    
+    # WAL lets snapshots and long reads run without blocking writers
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     # Users table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -24,11 +182,21 @@ def init_db():
             is_active BOOLEAN DEFAULT 1,
             is_registered BOOLEAN DEFAULT 0,
             last_response TEXT,
+            timezone TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
     
+    # Databases created before per-user time zones
+    _add_column(cursor, 'users', 'timezone', 'TEXT')
+    
+    # Invitation audience per time zone bucket (NULL = bot time zone)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_audience_timezone
+        ON users (timezone) WHERE is_registered = 1 AND is_active = 1
+    """)
+    
     # Registrations table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS registrations (
@@ -42,15 +210,224 @@ def init_db():
         )
     """)
     
+    # Meeting lookups and FIFO waitlist order
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_registrations_meeting
+        ON registrations (meeting_date, status, created_at)
+    """)
+    
+    # Registrations of past meetings moved out by the retention job
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS registrations_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            meeting_date TEXT NOT NULL,
+            status TEXT,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Seat counters for meetings with limited capacity
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS meeting_seats (
+            meeting_date TEXT PRIMARY KEY,
+            capacity INTEGER NOT NULL,
+            taken INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Append-only log of invitation answers, latest row per (meeting, user) wins
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            meeting_date TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_responses_meeting_user
+        ON responses (meeting_date, user_id, id, response)
+    """)
+    
+    # Deliveries that failed permanently, kept for bulk replay
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tg_id BIGINT NOT NULL,
+            broadcast TEXT NOT NULL,
+            text TEXT NOT NULL,
+            reply_markup TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Daily rollups: one counter per (day, metric, dimension), maintained on write paths
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            dimension TEXT NOT NULL DEFAULT '',
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, metric, dimension)
+        ) WITHOUT ROWID
+    """)
+    
+    _backfill_daily_stats(cursor)
+    
+    global USER_SEARCH_FTS
+    USER_SEARCH_FTS = _create_user_search_index(cursor)
+    
     conn.commit()
     conn.close()
 
 
+def _add_column(cursor, table: str, column: str, definition: str):
+    """Add column to existing table if it is missing"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"Added column {table}.{column}")
+
+
+def incremental_vacuum(max_pages: int = 0, db_path: Path = None) -> int:
+    """Return up to max_pages free pages (0 = all) to the OS; return number of pages freed"""
+    conn = sqlite3.connect(db_path or current_db_path())
+    cursor = conn.cursor()
+    
+    cursor.execute("PRAGMA freelist_count")
+    free_before = cursor.fetchone()[0]
+    # The pragma frees one page per result row, fetch all of them
+    cursor.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+    cursor.execute("PRAGMA freelist_count")
+    freed = free_before - cursor.fetchone()[0]
+    
+    conn.close()
+    return freed
+
+
+def _create_user_search_index(cursor) -> bool:
+    """Create FTS5 index over user names, kept in sync with users by triggers"""
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE name = 'users_fts')")
+    exists = bool(cursor.fetchone()[0])
+    
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                first_name, last_name, username,
+                content='users', content_rowid='id',
+                prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 is not available, user search will scan the users table: {e}")
+        return False
+    
+    _create_user_search_triggers(cursor)
+    
+    if not exists:
+        # Index users that were created before the search index existed
+        cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+    
+    return True
+
+
+def _create_user_search_triggers(cursor):
+    """Create triggers that keep users_fts in sync with users"""
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts (rowid, first_name, last_name, username)
+            VALUES (new.id, new.first_name, new.last_name, new.username);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, first_name, last_name, username)
+            VALUES ('delete', old.id, old.first_name, old.last_name, old.username);
+        END
+    """)
+    # Status updates (is_active, last_response...) do not touch the index
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF first_name, last_name, username ON users
+        WHEN old.first_name IS NOT new.first_name
+          OR old.last_name IS NOT new.last_name
+          OR old.username IS NOT new.username
+        BEGIN
+            INSERT INTO users_fts (users_fts, rowid, first_name, last_name, username)
+            VALUES ('delete', old.id, old.first_name, old.last_name, old.username);
+            INSERT INTO users_fts (rowid, first_name, last_name, username)
+            VALUES (new.id, new.first_name, new.last_name, new.username);
+        END
+    """)
+
+
+def drop_user_search_triggers(cursor):
+    """Stop syncing users_fts on every write (for bulk imports)"""
+    if not USER_SEARCH_FTS:
+        return
+    for trigger in ('users_fts_insert', 'users_fts_delete', 'users_fts_update'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+def rebuild_user_search_index(cursor):
+    """Restore sync triggers and rebuild users_fts from the users table"""
+    if not USER_SEARCH_FTS:
+        return
+    _create_user_search_triggers(cursor)
+    cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+
+
+def _fts_prefix_query(text: str) -> str:
+    """Turn user input into FTS5 query where every word is a prefix match"""
+    words = [word.strip('@"*') for word in text.split()]
+    # Quotes inside a word are doubled, FTS5 string escaping
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in words if word)
+
+
+def _backfill_daily_stats(cursor):
+    """Fill empty rollups from existing rows (runs once, when rollups are first created)"""
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM daily_stats)")
+    if cursor.fetchone()[0]:
+        return
+    
+    cursor.execute("""
+        INSERT INTO daily_stats (day, metric, dimension, value)
+        SELECT date(created_at), 'new_users', '', COUNT(*)
+        FROM users GROUP BY date(created_at)
+    """)
+    cursor.execute("""
+        INSERT INTO daily_stats (day, metric, dimension, value)
+        SELECT date(created_at), 'registrations', meeting_date, COUNT(*)
+        FROM registrations GROUP BY date(created_at), meeting_date
+    """)
+
+
+def _invitation_week(day) -> str:
+    """Monday of the week, used as invitation week key"""
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _bump_stat(cursor, metric: str, dimension: str = '', amount: int = 1):
+    """Add amount to today's rollup counter (in the caller's transaction)"""
+    if amount <= 0:
+        return
+    cursor.execute("""
+        INSERT INTO daily_stats (day, metric, dimension, value)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, metric, dimension) DO UPDATE SET value = value + excluded.value
+    """, (datetime.now().date().isoformat(), metric, dimension, amount))
+
+
 class User:
     """User model"""
     def __init__(self, tg_id: int, first_name: str = None, last_name: str = None, 
                  username: str = None, is_active: bool = True, is_registered: bool = False,
-                 last_response: str = None, id: int = None):
+                 last_response: str = None, timezone: str = None, id: int = None):
         self.id = id
         self.tg_id = tg_id
         self.first_name = first_name
@@ -59,6 +436,7 @@ class User:
         self.is_active = is_active
         self.is_registered = is_registered
         self.last_response = last_response
+        self.timezone = timezone
     
     def __repr__(self):
         return f"<User(tg_id={self.tg_id}, username={self.username})>"
@@ -67,12 +445,13 @@ class User:
 class UserRepository:
     """Repository for user operations"""
     
-    def __init__(self):
-        self.db_path = DB_PATH
+    def __init__(self, db_path: Path = None):
+        # None = database of the current tenant
+        self.db_path = db_path
     
     def _get_connection(self):
         """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        return _connect(self.db_path or current_db_path())
     
     def create_user(self, tg_id: int, first_name: str = None, last_name: str = None,
                     username: str = None) -> User:
@@ -84,14 +463,63 @@ class UserRepository:
             INSERT INTO users (tg_id, first_name, last_name, username)
             VALUES (?, ?, ?, ?)
         """, (tg_id, first_name, last_name, username))
+        user_id = cursor.lastrowid
+        _bump_stat(cursor, 'new_users')
         
         conn.commit()
-        user_id = cursor.lastrowid
         conn.close()
         
+        index = _audience(self.db_path)
+        if index:
+            index.set_user(tg_id, user_id, is_active=True, is_registered=False)
+        
         return User(tg_id=tg_id, first_name=first_name, last_name=last_name,
                    username=username, id=user_id)
     
+    def upsert_user(self, tg_id: int, first_name: str = None, last_name: str = None,
+                    username: str = None) -> Tuple[Optional[int], str]:
+        """Create user or reactivate inactive one in a single statement.
+        
+        Returns (user id, outcome) where outcome is 'created', 'reactivated' or
+        'existing'. Active users are left untouched and get (None, 'existing').
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            INSERT INTO users (tg_id, first_name, last_name, username)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (tg_id) DO UPDATE SET
+                is_active = 1,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                username = excluded.username,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE users.is_active = 0
+            RETURNING id
+        """, (tg_id, first_name, last_name, username))
+        
+        row = cursor.fetchone()
+        if row is None:
+            outcome = 'existing'
+        elif cursor.lastrowid == row[0]:
+            # lastrowid only moves to this row when it was inserted, not updated
+            outcome = 'created'
+            _bump_stat(cursor, 'new_users')
+        else:
+            outcome = 'reactivated'
+        
+        conn.commit()
+        conn.close()
+        
+        index = _audience(self.db_path)
+        if index and outcome == 'created':
+            index.set_user(tg_id, row[0], is_active=True, is_registered=False)
+        elif index and outcome == 'reactivated':
+            index.set_user(tg_id, is_active=True)
+        
+        return (row[0] if row else None), outcome
+    
     def get_user_by_tg_id(self, tg_id: int) -> Optional[User]:
         """Get user by Telegram ID"""
         conn = self._get_connection()
@@ -99,7 +527,7 @@ class UserRepository:
         
         cursor.execute("""
             SELECT id, tg_id, first_name, last_name, username, 
-                   is_active, is_registered, last_response
+                   is_active, is_registered, last_response, timezone
             FROM users WHERE tg_id = ?
         """, (tg_id,))
         
@@ -110,14 +538,15 @@ class UserRepository:
             return User(
                 id=row[0], tg_id=row[1], first_name=row[2], last_name=row[3],
                 username=row[4], is_active=bool(row[5]), is_registered=bool(row[6]),
-                last_response=row[7]
+                last_response=row[7], timezone=row[8]
             )
         return None
     
-    def update_user(self, tg_id: int, **kwargs):
-        """Update user fields"""
+    def update_user(self, tg_id: int, **kwargs) -> bool:
+        """Update user fields, return False if user does not exist"""
         conn = self._get_connection()
         cursor = conn.cursor()
+        updated = False
         
         # Build update query dynamically
         fields = []
@@ -127,12 +556,110 @@ class UserRepository:
             values.append(value)
         
         if fields:
+            # Only count an unsubscribe when an active user becomes inactive
+            was_active = False
+            if 'is_active' in kwargs and not kwargs['is_active']:
+                cursor.execute("SELECT is_active FROM users WHERE tg_id = ?", (tg_id,))
+                row = cursor.fetchone()
+                was_active = bool(row and row[0])
+            
             values.append(tg_id)
             query = f"UPDATE users SET {', '.join(fields)}, updated_at = CURRENT_TIMESTAMP WHERE tg_id = ?"
             cursor.execute(query, values)
+            updated = cursor.rowcount > 0
+            
+            if updated:
+                if was_active:
+                    _bump_stat(cursor, 'unsubscribes')
+                if kwargs.get('last_response'):
+                    _bump_stat(cursor, f"response_{kwargs['last_response']}",
+                               _invitation_week(datetime.now().date()))
             conn.commit()
         
         conn.close()
+        
+        index = _audience(self.db_path)
+        if index and updated:
+            index.set_user(tg_id, **{key: value for key, value in kwargs.items()
+                                     if key in ('is_active', 'is_registered', 'timezone')})
+        
+        return updated
+    
+    def search_users(self, query: str, limit: int = 20) -> List[tuple]:
+        """Find users by name/username prefix, return [(User, [Registration])] best matches first"""
+        if USER_SEARCH_FTS:
+            match = _fts_prefix_query(query)
+            if not match:
+                return []
+            hits_sql = """
+                SELECT rowid, rank FROM users_fts
+                WHERE users_fts MATCH ? ORDER BY rank LIMIT ?
+            """
+            params = (match, limit)
+        else:
+            prefix = query.strip().lstrip('@') + '%'
+            hits_sql = """
+                SELECT id AS rowid, 0 AS rank FROM users
+                WHERE first_name LIKE ? OR last_name LIKE ? OR username LIKE ? LIMIT ?
+            """
+            params = (prefix, prefix, prefix, limit)
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        # Matching users and all their registrations in one query
+        cursor.execute(f"""
+            WITH hits AS ({hits_sql})
+            SELECT u.id, u.tg_id, u.first_name, u.last_name, u.username,
+                   u.is_active, u.is_registered, u.last_response,
+                   r.id, r.meeting_date, r.status
+            FROM hits
+            JOIN users u ON u.id = hits.rowid
+            LEFT JOIN registrations r ON r.user_id = u.id
+            ORDER BY hits.rank, u.id, r.meeting_date
+        """, params)
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        results = []
+        for row in rows:
+            if not results or results[-1][0].id != row[0]:
+                results.append((User(
+                    id=row[0], tg_id=row[1], first_name=row[2], last_name=row[3],
+                    username=row[4], is_active=bool(row[5]), is_registered=bool(row[6]),
+                    last_response=row[7]
+                ), []))
+            if row[8] is not None:
+                results[-1][1].append(Registration(
+                    id=row[8], user_id=row[0], meeting_date=row[9], status=row[10]
+                ))
+        
+        return results
+    
+    def deactivate_users(self, tg_ids: List[int]) -> int:
+        """Mark users inactive in one statement, return number of users changed"""
+        if not tg_ids:
+            return 0
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            UPDATE users SET is_active = 0, updated_at = CURRENT_TIMESTAMP
+            WHERE is_active = 1 AND tg_id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(list(tg_ids)),))
+        
+        affected = cursor.rowcount
+        _bump_stat(cursor, 'unreachable', amount=affected)
+        conn.commit()
+        conn.close()
+        
+        index = _audience(self.db_path)
+        if index:
+            index.deactivate(tg_ids)
+        
+        return affected
     
     def get_all_registered_users(self) -> List[User]:
         """Get all registered and active users"""
@@ -158,6 +685,87 @@ class UserRepository:
         
         return users
     
+    def get_registered_users_in_timezone(self, timezone: str, include_unset: bool = False,
+                                         exclude_meeting: str = None) -> List[User]:
+        """Get registered and active users of one time zone bucket.
+        
+        With include_unset, users without their own time zone are included too.
+        With exclude_meeting, users holding a registration (not waitlisted or
+        cancelled) for that meeting are left out. Served from the audience
+        index when it is loaded.
+        """
+        index = _audience(self.db_path)
+        if index:
+            bitmap = index.audience(timezone, include_unset)
+            if exclude_meeting:
+                bitmap &= ~index.meetings.get(exclude_meeting, 0)
+            return [User(tg_id=tg_id) for tg_id in index.tg_ids_of(bitmap)]
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        # Two index range scans instead of an OR that would scan all users;
+        # the anti-join is one lookup in the (user_id, meeting_date) unique index per user
+        cursor.execute("""
+            SELECT id, tg_id, first_name, last_name, username,
+                   is_active, is_registered, last_response, timezone
+            FROM users WHERE is_registered = 1 AND is_active = 1 AND timezone = ?
+              AND NOT EXISTS (SELECT 1 FROM registrations r WHERE r.user_id = users.id
+                              AND r.meeting_date = ? AND r.status = 'registered')
+            UNION ALL
+            SELECT id, tg_id, first_name, last_name, username,
+                   is_active, is_registered, last_response, timezone
+            FROM users WHERE is_registered = 1 AND is_active = 1 AND timezone IS NULL AND ?
+              AND NOT EXISTS (SELECT 1 FROM registrations r WHERE r.user_id = users.id
+                              AND r.meeting_date = ? AND r.status = 'registered')
+        """, (timezone, exclude_meeting, include_unset, exclude_meeting))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [User(
+            id=row[0], tg_id=row[1], first_name=row[2], last_name=row[3],
+            username=row[4], is_active=bool(row[5]), is_registered=bool(row[6]),
+            last_response=row[7], timezone=row[8]
+        ) for row in rows]
+    
+    def count_registered_for_meeting(self, meeting_date: str, timezone: str, include_unset: bool = False) -> int:
+        """Count users of a time zone bucket's audience that hold a registration for the meeting"""
+        index = _audience(self.db_path)
+        if index:
+            return (index.audience(timezone, include_unset) & index.meetings.get(meeting_date, 0)).bit_count()
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        # Walks the registrations of one meeting only
+        cursor.execute("""
+            SELECT COUNT(*) FROM registrations r JOIN users u ON u.id = r.user_id
+            WHERE r.meeting_date = ? AND r.status = 'registered'
+              AND u.is_registered = 1 AND u.is_active = 1
+              AND (u.timezone = ? OR (u.timezone IS NULL AND ?))
+        """, (meeting_date, timezone, include_unset))
+        
+        count = cursor.fetchone()[0]
+        conn.close()
+        
+        return count
+    
+    def get_audience_timezones(self) -> List[str]:
+        """Get time zones chosen by registered and active users"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT DISTINCT timezone FROM users
+            WHERE is_registered = 1 AND is_active = 1 AND timezone IS NOT NULL
+        """)
+        
+        timezones = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        
+        return timezones
+    
     def get_users_by_response(self, response: str) -> List[User]:
         """Get users by their last response"""
         conn = self._get_connection()
@@ -185,57 +793,245 @@ class UserRepository:
 
 class Registration:
     """Registration model"""
-    def __init__(self, user_id: int, meeting_date: str, status: str = "registered", id: int = None):
+    def __init__(self, user_id: int, meeting_date: str, status: str = "registered", id: int = None,
+                 promoted: List[int] = None):
         self.id = id
         self.user_id = user_id
         self.meeting_date = meeting_date
         self.status = status
+        # Telegram IDs of waitlisted users given a seat by a capacity increase applied with this registration
+        self.promoted = promoted or []
     
     def __repr__(self):
         return f"<Registration(user_id={self.user_id}, meeting_date={self.meeting_date})>"
 
 
+# Insert tail that revives a cancelled registration and returns nothing for an active one
+_REVIVE_REGISTRATION_SQL = """
+    ON CONFLICT (user_id, meeting_date) DO UPDATE SET
+        status = 'registered',
+        created_at = CURRENT_TIMESTAMP
+    WHERE registrations.status != 'registered'
+    RETURNING id, user_id, meeting_date, status
+"""
+
+
+def _sync_meeting_seats(cursor, meeting_date: str, capacity: int) -> List[int]:
+    """Create seat counter on first use and apply capacity changes from config.
+    
+    Returns Telegram IDs of waitlisted users promoted into added seats.
+    """
+    cursor.execute("SELECT capacity FROM meeting_seats WHERE meeting_date = ?", (meeting_date,))
+    row = cursor.fetchone()
+    
+    if row is None:
+        # Count seats already taken before the limit was introduced
+        cursor.execute("""
+            INSERT INTO meeting_seats (meeting_date, capacity, taken)
+            SELECT ?, ?, COUNT(*) FROM registrations
+            WHERE meeting_date = ? AND status = 'registered'
+        """, (meeting_date, capacity, meeting_date))
+    elif row[0] != capacity:
+        cursor.execute("UPDATE meeting_seats SET capacity = ? WHERE meeting_date = ?", (capacity, meeting_date))
+        if capacity > row[0]:
+            return _promote_waitlist(cursor, meeting_date)
+    return []
+
+
+def resync_meeting_seats(cursor):
+    """Recount taken seats of all counters, after writes that bypass them (bulk import)"""
+    cursor.execute("""
+        UPDATE meeting_seats SET taken = (
+            SELECT COUNT(*) FROM registrations r
+            WHERE r.meeting_date = meeting_seats.meeting_date AND r.status = 'registered'
+        )
+    """)
+
+
+def _promote_waitlist(cursor, meeting_date: str) -> List[int]:
+    """Move waitlisted users into free seats in one batch (FIFO), return their Telegram IDs"""
+    cursor.execute("SELECT capacity - taken FROM meeting_seats WHERE meeting_date = ?", (meeting_date,))
+    row = cursor.fetchone()
+    free_seats = row[0] if row else 0
+    if free_seats <= 0:
+        return []
+    
+    cursor.execute("""
+        UPDATE registrations SET status = 'registered'
+        WHERE id IN (
+            SELECT id FROM registrations
+            WHERE meeting_date = ? AND status = 'waitlisted'
+            ORDER BY created_at, id
+            LIMIT ?
+        )
+        RETURNING user_id
+    """, (meeting_date, free_seats))
+    user_ids = [row[0] for row in cursor.fetchall()]
+    if not user_ids:
+        return []
+    
+    cursor.execute("""
+        UPDATE meeting_seats SET taken = taken + ? WHERE meeting_date = ?
+    """, (len(user_ids), meeting_date))
+    _bump_stat(cursor, 'promotions', meeting_date, len(user_ids))
+    
+    cursor.execute("""
+        SELECT tg_id FROM users WHERE id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(user_ids),))
+    return [row[0] for row in cursor.fetchall()]
+
+
 class RegistrationRepository:
     """Repository for registration operations"""
     
-    def __init__(self):
-        self.db_path = DB_PATH
+    def __init__(self, db_path: Path = None):
+        # None = database of the current tenant
+        self.db_path = db_path
     
     def _get_connection(self):
         """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        return _connect(self.db_path or current_db_path())
+    
+    def _seat_capacity(self, meeting_date: str) -> Optional[int]:
+        """Capacity of the meeting's seat counter, None if the meeting has none"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT capacity FROM meeting_seats WHERE meeting_date = ?", (meeting_date,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        return row[0] if row else None
     
-    def create_registration(self, user_id: int, meeting_date: str) -> Registration:
-        """Create new registration"""
+    def create_registration(self, user_id: int, meeting_date: str) -> Optional[Registration]:
+        """Create registration or revive a cancelled one; None if already registered.
+        
+        Meetings with a seat counter go through it (the user may be waitlisted).
+        """
+        capacity = self._seat_capacity(meeting_date)
+        if capacity is not None:
+            return self._register_with_capacity(meeting_date, capacity, user_id=user_id)
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            INSERT INTO registrations (user_id, meeting_date)
+            VALUES (?, ?)
+            {_REVIVE_REGISTRATION_SQL}
+        """, (user_id, meeting_date))
+        
+        row = cursor.fetchone()
+        if row:
+            _bump_stat(cursor, 'registrations', meeting_date)
+        
+        conn.commit()
+        conn.close()
+        
+        index = _audience(self.db_path)
+        if index and row:
+            index.set_registration(meeting_date, True, user_id=user_id)
+        
+        if row:
+            return Registration(id=row[0], user_id=row[1], meeting_date=row[2], status=row[3])
+        return None
+    
+    def register_by_tg_id(self, tg_id: int, meeting_date: str,
+                          capacity: Optional[int] = None) -> Optional[Registration]:
+        """Register user by Telegram ID.
+        
+        Without capacity this is a single statement. With capacity a seat is taken
+        by a conditional counter update in the same transaction; when the meeting
+        is full the user is put on the waitlist (status 'waitlisted').
+        Returns None if the user does not exist or is already registered/waitlisted.
+        """
+        # A counter from an earlier capacity stays authoritative even if config drops it
+        capacity = capacity if capacity is not None else self._seat_capacity(meeting_date)
+        if capacity is not None:
+            return self._register_with_capacity(meeting_date, capacity, tg_id=tg_id)
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            INSERT INTO registrations (user_id, meeting_date)
+            SELECT id, ? FROM users WHERE tg_id = ?
+            {_REVIVE_REGISTRATION_SQL}
+        """, (meeting_date, tg_id))
+        
+        row = cursor.fetchone()
+        if row:
+            _bump_stat(cursor, 'registrations', meeting_date)
+        
+        conn.commit()
+        conn.close()
+        
+        index = _audience(self.db_path)
+        if index and row:
+            index.set_registration(meeting_date, True, user_id=row[1])
+        
+        if row:
+            return Registration(id=row[0], user_id=row[1], meeting_date=row[2], status=row[3])
+        return None
+    
+    def _register_with_capacity(self, meeting_date: str, capacity: int, tg_id: int = None,
+                                user_id: int = None) -> Optional[Registration]:
+        """Take a seat or a waitlist place in one write transaction; user given by tg_id or user_id"""
+        user_column, user_value = ('id', user_id) if user_id is not None else ('tg_id', tg_id)
         conn = self._get_connection()
         cursor = conn.cursor()
         
         try:
+            # Write lock up front: concurrent registrations queue here instead of failing on upgrade
+            cursor.execute("BEGIN IMMEDIATE")
+            promoted = _sync_meeting_seats(cursor, meeting_date, capacity)
+            
             cursor.execute("""
-                INSERT INTO registrations (user_id, meeting_date)
-                VALUES (?, ?)
-            """, (user_id, meeting_date))
+                UPDATE meeting_seats SET taken = taken + 1
+                WHERE meeting_date = ? AND taken < capacity
+            """, (meeting_date,))
+            status = 'registered' if cursor.rowcount else 'waitlisted'
             
-            conn.commit()
-            reg_id = cursor.lastrowid
-            conn.close()
+            cursor.execute(f"""
+                INSERT INTO registrations (user_id, meeting_date, status)
+                SELECT id, ?, ? FROM users WHERE {user_column} = ?
+                ON CONFLICT (user_id, meeting_date) DO UPDATE SET
+                    status = excluded.status,
+                    created_at = CURRENT_TIMESTAMP
+                WHERE registrations.status = 'cancelled'
+                RETURNING id, user_id, meeting_date, status
+            """, (meeting_date, status, user_value))
+            row = cursor.fetchone()
+            
+            if row is None:
+                # Unknown user or already registered - give the seat back
+                conn.rollback()
+                return None
             
-            return Registration(user_id=user_id, meeting_date=meeting_date, id=reg_id)
-        except sqlite3.IntegrityError:
-            # Already registered
+            _bump_stat(cursor, 'registrations' if status == 'registered' else 'waitlisted', meeting_date)
+            conn.commit()
+        finally:
             conn.close()
-            return None
+        
+        index = _audience(self.db_path)
+        if index:
+            if status == 'registered':
+                index.set_registration(meeting_date, True, user_id=row[1])
+            for tg_id in promoted:
+                index.set_registration(meeting_date, True, tg_id=tg_id)
+        
+        return Registration(id=row[0], user_id=row[1], meeting_date=row[2], status=row[3], promoted=promoted)
     
-    def get_user_registrations(self, user_id: int) -> List[Registration]:
-        """Get all registrations for a user"""
+    def get_user_registrations(self, user_id: int, since_date: str = '') -> List[Registration]:
+        """Get registrations for a user, for meetings on or after since_date"""
         conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
             SELECT id, user_id, meeting_date, status
-            FROM registrations WHERE user_id = ?
+            FROM registrations WHERE user_id = ? AND meeting_date >= ?
             ORDER BY meeting_date
-        """, (user_id,))
+        """, (user_id, since_date))
         
         rows = cursor.fetchall()
         conn.close()
@@ -255,7 +1051,7 @@ class RegistrationRepository:
         
         cursor.execute("""
             SELECT COUNT(*) FROM registrations
-            WHERE user_id = ? AND meeting_date = ?
+            WHERE user_id = ? AND meeting_date = ? AND status = 'registered'
         """, (user_id, meeting_date))
         
         count = cursor.fetchone()[0]
@@ -263,21 +1059,66 @@ class RegistrationRepository:
         
         return count > 0
     
-    def cancel_registration(self, user_id: int, meeting_date: str) -> bool:
-        """Cancel registration"""
+    def cancel_registration(self, user_id: int, meeting_date: str) -> Tuple[bool, List[int]]:
+        """Cancel registration and fill the freed seat from the waitlist.
+        
+        Returns (cancelled, Telegram IDs of users promoted from the waitlist).
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        promoted = []
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT status FROM registrations
+                WHERE user_id = ? AND meeting_date = ? AND status != 'cancelled'
+            """, (user_id, meeting_date))
+            row = cursor.fetchone()
+            
+            if row is None:
+                conn.rollback()
+                return False, []
+            
+            cursor.execute("""
+                UPDATE registrations SET status = 'cancelled'
+                WHERE user_id = ? AND meeting_date = ?
+            """, (user_id, meeting_date))
+            _bump_stat(cursor, 'cancellations', meeting_date)
+            
+            if row[0] == 'registered':
+                cursor.execute("""
+                    UPDATE meeting_seats SET taken = taken - 1
+                    WHERE meeting_date = ? AND taken > 0
+                """, (meeting_date,))
+                promoted = _promote_waitlist(cursor, meeting_date)
+            
+            conn.commit()
+        finally:
+            conn.close()
+        
+        index = _audience(self.db_path)
+        if index:
+            index.set_registration(meeting_date, False, user_id=user_id)
+            for tg_id in promoted:
+                index.set_registration(meeting_date, True, tg_id=tg_id)
+        
+        return True, promoted
+    
+    def get_registration_status(self, user_id: int, meeting_date: str) -> Optional[str]:
+        """Get registration status for a meeting, None if user never registered"""
         conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
-            UPDATE registrations SET status = 'cancelled'
+            SELECT status FROM registrations
             WHERE user_id = ? AND meeting_date = ?
         """, (user_id, meeting_date))
         
-        affected = cursor.rowcount
-        conn.commit()
+        row = cursor.fetchone()
         conn.close()
         
-        return affected > 0
+        return row[0] if row else None
     
     def get_meeting_registrations(self, meeting_date: str) -> List[tuple]:
         """Get all registrations for a specific meeting with user info"""
@@ -297,6 +1138,61 @@ class RegistrationRepository:
         
         return rows
     
+    def get_registered_users(self, meeting_date: str) -> List[User]:
+        """Get active users holding a registration (not waitlisted) for the meeting"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT u.tg_id FROM registrations r
+            JOIN users u ON r.user_id = u.id
+            WHERE r.meeting_date = ? AND r.status = 'registered' AND u.is_active = 1
+        """, (meeting_date,))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [User(tg_id=row[0]) for row in rows]
+    
+    def archive_past_registrations(self, before_date: str, batch_size: int = 500) -> int:
+        """Move registrations for meetings before given date to the archive table.
+        
+        Every batch is its own short transaction, so handlers can write in between.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        archived = 0
+        
+        while True:
+            cursor.execute("""
+                SELECT json_group_array(id) FROM (
+                    SELECT id FROM registrations WHERE meeting_date < ? LIMIT ?
+                )
+            """, (before_date, batch_size))
+            ids = cursor.fetchone()[0]
+            if ids == '[]':
+                break
+            
+            cursor.execute("""
+                INSERT OR REPLACE INTO registrations_archive (id, user_id, meeting_date, status, created_at)
+                SELECT id, user_id, meeting_date, status, created_at FROM registrations
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (ids,))
+            cursor.execute("DELETE FROM registrations WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+            archived += cursor.rowcount
+            conn.commit()
+        
+        # Seat counters of past meetings are not needed any more
+        cursor.execute("DELETE FROM meeting_seats WHERE meeting_date < ?", (before_date,))
+        conn.commit()
+        conn.close()
+        
+        index = _audience(self.db_path)
+        if index:
+            index.drop_meetings_before(before_date)
+        
+        return archived
+    
     def get_all_registrations_with_users(self) -> List[tuple]:
         """Get all registrations with user info"""
         conn = self._get_connection()
@@ -316,9 +1212,304 @@ class RegistrationRepository:
         return rows
 
 
+class StatsRepository:
+    """Repository for pre-aggregated daily statistics"""
+    
+    def __init__(self, db_path: Path = None):
+        # None = database of the current tenant
+        self.db_path = db_path
+    
+    def _get_connection(self):
+        """Get database connection"""
+        return _connect(self.db_path or current_db_path())
+    
+    def get_daily_totals(self, days: int) -> List[tuple]:
+        """Get (day, metric, value) totals for the last N days, summed over dimensions"""
+        since = (datetime.now().date() - timedelta(days=days - 1)).isoformat()
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT day, metric, SUM(value)
+            FROM daily_stats WHERE day >= ?
+            GROUP BY day, metric
+            ORDER BY day
+        """, (since,))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return rows
+    
+    def get_totals_by_dimension(self, metrics: List[str], since_day: str = '') -> List[tuple]:
+        """Get (metric, dimension, value) totals over all days since since_day"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        placeholders = ', '.join('?' for _ in metrics)
+        cursor.execute(f"""
+            SELECT metric, dimension, SUM(value)
+            FROM daily_stats WHERE metric IN ({placeholders}) AND day >= ?
+            GROUP BY metric, dimension
+            ORDER BY dimension
+        """, (*metrics, since_day))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return rows
+
+
+class ResponseRepository:
+    """Repository for invitation responses.
+    
+    Responses are buffered in memory and written in batches by flush(), which
+    runs when the buffer is full, periodically from the scheduler and before
+    any read of responses. The buffer is guarded by a lock, flush() may be
+    called from worker threads.
+    """
+    
+    def __init__(self, db_path: Path = None, batch_size: int = 50):
+        # None = database of the current tenant
+        self.db_path = db_path
+        self.batch_size = batch_size
+        # Database path -> queued responses
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Smoothed time of a batch write including waits for the write lock (broadcast pacing signal)
+        self._write_latency = 0.0
+        self._written_at = 0.0
+    
+    def _get_connection(self):
+        """Get database connection"""
+        return _connect(self.db_path or current_db_path())
+    
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(batch) for batch in self._pending.values())
+    
+    def write_latency(self, max_age: float = 10.0) -> float:
+        """Smoothed batch write time in seconds, 0 if nothing was written recently"""
+        if time.monotonic() - self._written_at > max_age:
+            return 0.0
+        return self._write_latency
+    
+    def record(self, tg_id: int, meeting_date: str, response: str):
+        """Queue user's answer to the invitation for a meeting"""
+        try:
+            datetime.strptime(meeting_date, '%Y-%m-%d')
+        except ValueError:
+            # Callback data comes from the client; a bad date would fail the whole batch
+            logger.warning(f"Ignored response of {tg_id} for invalid meeting date {meeting_date!r}")
+            return
+        
+        db_path = self.db_path or current_db_path()
+        with self._lock:
+            pending = self._pending.setdefault(db_path, [])
+            pending.append((meeting_date, response, datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), tg_id))
+            full = len(pending) >= self.batch_size
+        if full:
+            self._flush_batch(db_path)
+    
+    def flush(self) -> int:
+        """Write queued responses of all databases, return number written"""
+        with self._lock:
+            db_paths = list(self._pending)
+        return sum(self._flush_batch(db_path) for db_path in db_paths)
+    
+    def _flush_batch(self, db_path: Path) -> int:
+        """Write queued responses of one database in one transaction"""
+        with self._lock:
+            batch = self._pending.pop(db_path, None)
+        if not batch:
+            return 0
+        
+        # Answers of many users are written on their own connection, never inside the
+        # caller's unit of work (its rollback would discard them). The unit is committed
+        # first, so it does not hold the write lock this connection waits for.
+        unit = current_unit_of_work()
+        if unit is not None:
+            unit.commit()
+        started_at = time.monotonic()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.executemany("""
+                INSERT INTO responses (user_id, meeting_date, response, created_at)
+                SELECT id, ?, ?, ? FROM users WHERE tg_id = ?
+            """, batch)
+            # Keep the latest answer on the user row as well
+            cursor.executemany("""
+                UPDATE users SET last_response = ?, updated_at = CURRENT_TIMESTAMP WHERE tg_id = ?
+            """, [(response, tg_id) for _, response, _, tg_id in batch])
+            
+            counts = {}
+            for meeting_date, response, _, _ in batch:
+                key = (response, _invitation_week(datetime.strptime(meeting_date, '%Y-%m-%d').date()))
+                counts[key] = counts.get(key, 0) + 1
+            for (response, week), amount in counts.items():
+                _bump_stat(cursor, f"response_{response}", week, amount)
+            
+            conn.commit()
+            
+            self._written_at = time.monotonic()
+            self._write_latency += 0.2 * (self._written_at - started_at - self._write_latency)
+            
+            index = get_audience_index(db_path)
+            if index:
+                index.set_responses([(tg_id, meeting_date, response)
+                                     for meeting_date, response, _, tg_id in batch])
+        except Exception as e:
+            # Keep the batch for the next flush
+            conn.rollback()
+            with self._lock:
+                self._pending[db_path] = batch + self._pending.get(db_path, [])
+            logger.error(f"Failed to write {len(batch)} responses: {e}")
+            return 0
+        finally:
+            conn.close()
+        
+        return len(batch)
+    
+    def get_users_by_response(self, meeting_date: str, response: str) -> List[User]:
+        """Get active users whose latest answer for the meeting is `response`"""
+        self.flush()
+        
+        index = _audience(self.db_path)
+        if index:
+            return [User(tg_id=tg_id) for tg_id in index.tg_ids_of(index.responded(meeting_date, response))]
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        # MAX(id) makes SQLite take `response` from the latest row of each group
+        cursor.execute("""
+            SELECT u.id, u.tg_id, u.first_name, u.last_name, u.username,
+                   u.is_active, u.is_registered, u.last_response
+            FROM (
+                SELECT user_id, response, MAX(id)
+                FROM responses WHERE meeting_date = ?
+                GROUP BY user_id
+            ) latest
+            JOIN users u ON u.id = latest.user_id
+            WHERE latest.response = ? AND u.is_registered = 1 AND u.is_active = 1
+        """, (meeting_date, response))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        users = []
+        for row in rows:
+            users.append(User(
+                id=row[0], tg_id=row[1], first_name=row[2], last_name=row[3],
+                username=row[4], is_active=bool(row[5]), is_registered=bool(row[6]),
+                last_response=row[7]
+            ))
+        
+        return users
+
+
+class DeadLetter:
+    """Failed delivery model"""
+    def __init__(self, tg_id: int, broadcast: str, text: str, reply_markup: str = None,
+                 error: str = None, attempts: int = 1, id: int = None):
+        self.id = id
+        self.tg_id = tg_id
+        self.broadcast = broadcast
+        self.text = text
+        self.reply_markup = reply_markup
+        self.error = error
+        self.attempts = attempts
+    
+    def __repr__(self):
+        return f"<DeadLetter(tg_id={self.tg_id}, broadcast={self.broadcast}, attempts={self.attempts})>"
+
+
+class DeadLetterRepository:
+    """Repository for permanently failed deliveries"""
+    
+    def __init__(self, db_path: Path = None):
+        # None = database of the current tenant
+        self.db_path = db_path
+    
+    def _get_connection(self):
+        """Get database connection"""
+        return _connect(self.db_path or current_db_path())
+    
+    def add_many(self, letters: List[DeadLetter]) -> int:
+        """Store failed deliveries in one transaction"""
+        if not letters:
+            return 0
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany("""
+            INSERT INTO dead_letters (tg_id, broadcast, text, reply_markup, error, attempts)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(letter.tg_id, letter.broadcast, letter.text, letter.reply_markup,
+               letter.error, letter.attempts) for letter in letters])
+        
+        conn.commit()
+        conn.close()
+        
+        return len(letters)
+    
+    def get_all(self, limit: int = None) -> List[DeadLetter]:
+        """Get failed deliveries, oldest first"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, tg_id, broadcast, text, reply_markup, error, attempts
+            FROM dead_letters ORDER BY id LIMIT ?
+        """, (limit if limit is not None else -1,))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [DeadLetter(id=row[0], tg_id=row[1], broadcast=row[2], text=row[3],
+                           reply_markup=row[4], error=row[5], attempts=row[6]) for row in rows]
+    
+    def count(self) -> int:
+        """Number of failed deliveries waiting for replay"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM dead_letters")
+        count = cursor.fetchone()[0]
+        conn.close()
+        
+        return count
+    
+    def delete(self, ids: List[int]) -> int:
+        """Remove replayed deliveries"""
+        if not ids:
+            return 0
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            DELETE FROM dead_letters WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(list(ids)),))
+        
+        affected = cursor.rowcount
+        conn.commit()
+        conn.close()
+        
+        return affected
+
+
 # Global repository instances
 user_repo = UserRepository()
 registration_repo = RegistrationRepository()
+stats_repo = StatsRepository()
+response_repo = ResponseRepository()
+dead_letter_repo = DeadLetterRepository()
 
 # Initialize database on import
 init_db()
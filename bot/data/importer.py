@@ -0,0 +1,267 @@
+"""Bulk import of users and registrations from CSV files.
+
+Accepts the bot's own CSV exports as well as plain subscriber lists. Rows are
+streamed and written in chunks with executemany, one transaction per chunk.
+
+Usage:
+    python -m bot.data.importer subscribers.csv [--chunk-size 1000] [--on-conflict skip|update] [--defer-indexes]
+"""
+import argparse
+import csv
+import logging
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+from bot.data.audience import check_audience_index
+from bot.data.database import (current_db_path, drop_user_search_triggers, rebuild_user_search_index,
+                               resync_meeting_seats)
+
+logger = logging.getLogger(__name__)
+
+# Rows written per transaction
+CHUNK_SIZE = 1000
+
+# Header aliases (lowercase, spaces -> underscores) -> column
+COLUMN_ALIASES = {
+    'tg_id': 'tg_id',
+    'telegram_id': 'tg_id',
+    'user_id': 'tg_id',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'username': 'username',
+    'is_active': 'is_active',
+    'is_registered': 'is_registered',
+    'meeting_date': 'meeting_date',
+    'status': 'status',
+    'registered_at': 'registered_at',
+}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'да', 'y', '+'}
+
+# Registration statuses the seat counters know; rows with any other status are skipped
+STATUSES = {'registered', 'waitlisted', 'cancelled'}
+
+# Meeting date formats besides ISO (with or without time), as spreadsheets save them
+DATE_FORMATS = ('%d.%m.%Y', '%d/%m/%Y')
+
+# Missing or empty flags (NULL) make new users active subscribers and leave
+# existing users' flags alone, so a plain list does not re-subscribe anyone
+UPSERT_USER_SQL = """
+    INSERT INTO users (tg_id, first_name, last_name, username, is_active, is_registered)
+    VALUES (?1, ?2, ?3, ?4, COALESCE(?5, 1), COALESCE(?6, 1))
+    ON CONFLICT (tg_id) DO UPDATE SET
+        first_name = COALESCE(excluded.first_name, first_name),
+        last_name = COALESCE(excluded.last_name, last_name),
+        username = COALESCE(excluded.username, username),
+        is_active = COALESCE(?5, is_active),
+        is_registered = COALESCE(?6, is_registered),
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Users referenced by registrations are created if missing, existing ones are left as is
+ENSURE_USER_SQL = """
+    INSERT INTO users (tg_id, first_name, username) VALUES (?, ?, ?)
+    ON CONFLICT (tg_id) DO NOTHING
+"""
+
+INSERT_REGISTRATION_SQL = """
+    INSERT INTO registrations (user_id, meeting_date, status, created_at)
+    SELECT id, ?, ?, COALESCE(?, CURRENT_TIMESTAMP) FROM users WHERE tg_id = ?
+    ON CONFLICT (user_id, meeting_date) DO {action}
+"""
+
+
+class ImportReport:
+    """Result of a bulk import"""
+    def __init__(self):
+        self.users_count = 0
+        self.registrations_count = 0
+        self.skipped_count = 0
+        self.elapsed = 0.0
+    
+    @property
+    def rows_count(self) -> int:
+        return self.users_count + self.registrations_count
+    
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows_count / self.elapsed if self.elapsed > 0 else 0.0
+    
+    def __repr__(self):
+        return (f"<ImportReport(users={self.users_count}, registrations={self.registrations_count}, "
+                f"skipped={self.skipped_count}, rows_per_sec={self.rows_per_sec:.0f})>")
+
+
+def _parse_bool(value: Optional[str]) -> Optional[int]:
+    """1/0 for a flag cell, None if the column is missing or the cell is empty"""
+    if value is None or not value.strip():
+        return None
+    return int(value.strip().lower() in TRUE_VALUES)
+
+
+def _parse_date(value: Optional[str]) -> Optional[str]:
+    """Meeting date as YYYY-MM-DD, None if the cell is empty or not a date"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.split()[0], date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_status(value: Optional[str]) -> Optional[str]:
+    """Known registration status (empty = registered), None for anything else"""
+    status = (value or '').strip().lower() or 'registered'
+    return status if status in STATUSES else None
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _read_rows(stream: TextIO, report: ImportReport) -> Iterator[dict]:
+    """Stream CSV rows as dicts keyed by normalized column names"""
+    header_line = stream.readline()
+    if not header_line:
+        return
+    
+    try:
+        dialect = csv.Sniffer().sniff(header_line, delimiters=',;\t')
+    except csv.Error:
+        # Single column file
+        dialect = csv.excel
+    header = next(csv.reader([header_line], dialect))
+    columns = [COLUMN_ALIASES.get(name.strip().lower().replace(' ', '_')) for name in header]
+    
+    if 'tg_id' not in columns:
+        raise ValueError("CSV must have a TG_ID column")
+    
+    for values in csv.reader(stream, dialect):
+        row = {column: value for column, value in zip(columns, values) if column}
+        try:
+            row['tg_id'] = int(row.get('tg_id', '').strip())
+        except ValueError:
+            report.skipped_count += 1
+            continue
+        yield row
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_csv(stream: TextIO, chunk_size: int = CHUNK_SIZE, on_conflict: str = 'skip',
+               defer_indexes: bool = False, db_path: Path = None) -> ImportReport:
+    """Import users or registrations (detected by a Meeting Date column) from CSV stream.
+
+    on_conflict controls existing registrations for the same (user, meeting_date):
+    'skip' keeps them, 'update' overwrites their status.
+    defer_indexes drops the user search triggers for the import and rebuilds the
+    index once at the end, which is faster for large files.
+    """
+    if on_conflict not in ('skip', 'update'):
+        raise ValueError(f"Unknown on_conflict mode: {on_conflict}")
+    
+    report = ImportReport()
+    started_at = time.monotonic()
+    registration_sql = INSERT_REGISTRATION_SQL.format(
+        action="NOTHING" if on_conflict == 'skip' else "UPDATE SET status = excluded.status"
+    )
+    
+    conn = sqlite3.connect(db_path or current_db_path())
+    cursor = conn.cursor()
+    # Safe in WAL mode: a crash can lose the last chunk, not corrupt the database
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    
+    try:
+        if defer_indexes:
+            drop_user_search_triggers(cursor)
+            conn.commit()
+        
+        for chunk in _chunks(_read_rows(stream, report), chunk_size):
+            if 'meeting_date' in chunk[0]:
+                registrations = []
+                for row in chunk:
+                    meeting_date, status = _parse_date(row.get('meeting_date')), _parse_status(row.get('status'))
+                    if meeting_date and status:
+                        registrations.append((row, meeting_date, status))
+                report.skipped_count += len(chunk) - len(registrations)
+                cursor.executemany(ENSURE_USER_SQL, [
+                    (row['tg_id'], _clean(row.get('first_name')), _clean(row.get('username')))
+                    for row, _, _ in registrations
+                ])
+                cursor.executemany(registration_sql, [
+                    (meeting_date, status, _clean(row.get('registered_at')), row['tg_id'])
+                    for row, meeting_date, status in registrations
+                ])
+                # Imported rows do not take seats one by one, recount the counters
+                resync_meeting_seats(cursor)
+                report.registrations_count += len(registrations)
+            else:
+                cursor.executemany(UPSERT_USER_SQL, [
+                    (row['tg_id'], _clean(row.get('first_name')), _clean(row.get('last_name')),
+                     _clean(row.get('username')), _parse_bool(row.get('is_active')),
+                     _parse_bool(row.get('is_registered')))
+                    for row in chunk
+                ])
+                report.users_count += len(chunk)
+            conn.commit()
+    finally:
+        if defer_indexes:
+            rebuild_user_search_index(cursor)
+            conn.commit()
+        conn.close()
+    
+    # Bulk writes bypass the repositories, bring the audience index up to date
+    check_audience_index(db_path or current_db_path())
+    
+    report.elapsed = time.monotonic() - started_at
+    logger.info(f"CSV import finished: {report}")
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Bulk import users or registrations from CSV")
+    parser.add_argument('path', type=Path, help="CSV file (users or registrations export)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="rows per transaction")
+    parser.add_argument('--on-conflict', choices=('skip', 'update'), default='skip',
+                        help="what to do with existing registrations")
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help="rebuild the search index once at the end instead of per row")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    with open(args.path, 'r', encoding='utf-8-sig', newline='') as f:
+        report = import_csv(f, chunk_size=args.chunk_size, on_conflict=args.on_conflict,
+                            defer_indexes=args.defer_indexes)
+    
+    print(f"Users: {report.users_count}, registrations: {report.registrations_count}, "
+          f"skipped: {report.skipped_count}")
+    print(f"{report.rows_count} rows in {report.elapsed:.2f}s ({report.rows_per_sec:.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
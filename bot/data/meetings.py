@@ -0,0 +1,72 @@
+"""Catalog of meetings from config, built once per config snapshot"""
+from bisect import bisect_left
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+from config import ConfigManager, current_tenant
+
+WEEKDAY_NAMES = ('Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье')
+
+
+@lru_cache(maxsize=1024)
+def format_date(iso_date: str, pattern: str = '%d.%m.%Y') -> str:
+    """Format YYYY-MM-DD date, for dates that are not in the catalog (past meetings, stats)"""
+    return datetime.strptime(iso_date, '%Y-%m-%d').strftime(pattern)
+
+
+class Meeting:
+    """Meeting from config with parsed date and formatted strings"""
+
+    def __init__(self, date: str, topic: str, time: str = '11:00', link: str = None, capacity: int = None):
+        self.date = date
+        self.topic = topic
+        self.time = time
+        self.link = link
+        self.capacity = capacity
+        self.day = datetime.strptime(date, '%Y-%m-%d').date()
+        # 13.11, 13.11.2025 and 13.11.2025 (Четверг)
+        self.short_date = self.day.strftime('%d.%m')
+        self.full_date = self.day.strftime('%d.%m.%Y')
+        self.weekday_date = f"{self.full_date} ({WEEKDAY_NAMES[self.day.weekday()]})"
+
+    def __repr__(self):
+        return f"<Meeting(date={self.date}, topic={self.topic})>"
+
+
+class MeetingsCatalog:
+    """Meetings sorted by date with bisect lookup of upcoming ones and lookup by date"""
+
+    def __init__(self, entries: Sequence):
+        self.meetings: List[Meeting] = sorted(
+            (Meeting(entry['date'], entry.get('topic', 'Встреча'), entry.get('time', '11:00'),
+                     entry.get('link'), entry.get('capacity')) for entry in entries),
+            key=lambda meeting: meeting.day
+        )
+        self._days = [meeting.day for meeting in self.meetings]
+        self.by_date: Dict[str, Meeting] = {meeting.date: meeting for meeting in self.meetings}
+
+    def upcoming(self, today: date = None) -> List[Meeting]:
+        """Meetings from today on"""
+        today = today or datetime.now().date()
+        return self.meetings[bisect_left(self._days, today):]
+
+    def get(self, meeting_date: str) -> Optional[Meeting]:
+        """Meeting on date, None if it is not in config"""
+        return self.by_date.get(meeting_date)
+
+    def __len__(self):
+        return len(self.meetings)
+
+
+# Config manager -> (upcoming_meetings of the snapshot the catalog was built from, catalog)
+_catalogs: Dict[ConfigManager, tuple] = {}
+
+
+def get_meetings_catalog() -> MeetingsCatalog:
+    """Catalog of the current tenant's config, rebuilt when the config is reloaded"""
+    config_manager = current_tenant.get().config_manager
+    entries = config_manager.snapshot.get('upcoming_meetings', ())
+    cached = _catalogs.get(config_manager)
+    if cached is None or cached[0] is not entries:
+        cached = _catalogs[config_manager] = (entries, MeetingsCatalog(entries))
+    return cached[1]
@@ -0,0 +1,68 @@
+"""Consistent point-in-time database snapshots and online backups"""
+import logging
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from bot.data.database import current_db_path
+
+logger = logging.getLogger(__name__)
+
+# Directory for online backups, next to the database file
+BACKUP_DIR_NAME = "backups"
+
+# Pages copied per backup step; the source lock is released between steps
+PAGES_PER_STEP = 256
+
+
+def create_snapshot(target_path: Path, db_path: Path = None, pages: int = PAGES_PER_STEP) -> Path:
+    """Copy database to target_path as of one point in time.
+
+    The copy runs inside a read transaction on the source connection, so in WAL
+    mode it sees one consistent state and is not restarted by concurrent
+    writes, while writers keep committing to the WAL.
+    """
+    source = sqlite3.connect(db_path or current_db_path())
+    target = sqlite3.connect(target_path)
+    
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+        source.backup(target, pages=pages)
+    finally:
+        source.rollback()
+        source.close()
+        target.close()
+    
+    return target_path
+
+
+@contextmanager
+def open_snapshot(db_path: Path = None):
+    """Yield path to a temporary consistent copy of the database for heavy read-only work"""
+    with tempfile.TemporaryDirectory(prefix="db_snapshot_") as tmp_dir:
+        yield create_snapshot(Path(tmp_dir) / "snapshot.sqlite3", db_path)
+
+
+def backup_database(keep: int = 7, db_path: Path = None) -> Path:
+    """Create online backup next to the database and remove all but the `keep` newest backups"""
+    db_path = db_path or current_db_path()
+    backup_dir = db_path.parent / BACKUP_DIR_NAME
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    # Write to a temporary name first, so a crash never leaves a half-written backup
+    partial_path = backup_dir / f"{db_path.stem}_{timestamp}.sqlite3.partial"
+    backup_path = backup_dir / f"{db_path.stem}_{timestamp}.sqlite3"
+    create_snapshot(partial_path, db_path)
+    partial_path.replace(backup_path)
+    
+    # Timestamp starts with a digit, so backups of "db" and "db_other" are kept apart
+    backups = sorted(backup_dir.glob(f"{db_path.stem}_[0-9]*.sqlite3"))
+    for old_backup in backups[:-keep] if keep > 0 else []:
+        old_backup.unlink()
+    
+    logger.info(f"Database backup created: {backup_path} ({backup_path.stat().st_size} bytes)")
+    return backup_path
@@ -1,23 +1,49 @@
 """Admin handler for administrative functions"""
+import asyncio
 import logging
 import csv
-from datetime import datetime
-from io import StringIO
-from aiogram import Router, F
-from aiogram.filters import Command
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO, TextIOWrapper
+from aiogram import Router, F, html
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, BufferedInputFile
-from bot.data.database import user_repo, registration_repo
-from config import config, DEMO_MODE
+from bot.data.audience import get_audience_index
+from bot.data.database import UserRepository, RegistrationRepository, user_repo, registration_repo, stats_repo, dead_letter_repo, current_db_path
+from bot.data.snapshot import open_snapshot, backup_database
+from bot.data.importer import import_csv
+from bot.data.meetings import format_date, get_meetings_catalog
+from bot.scheduler import broadcast
+from config import current_tenant, get_config, DEMO_MODE
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Maximum users shown in search results
+SEARCH_LIMIT = 10
+
+# Number of days shown in the trends view
+TRENDS_DAYS = 14
+
+# Minimal interval between edits of a broadcast progress message (seconds)
+PROGRESS_EDIT_INTERVAL = 3
+
+# Progress messages being updated: (chat_id, message_id) -> task
+_progress_watchers = {}
+
+# Running dead letter replays: tenant name -> task (one at a time, or every letter is sent twice)
+_dead_letter_replays = {}
+
 
 def is_admin(user_id: int) -> bool:
     """Check if user is admin (in DEMO_MODE, everyone is admin)"""
     if DEMO_MODE:
         return True
-    admin_ids = config.get('admins', [])
+    return is_configured_admin(user_id)
+
+
+def is_configured_admin(user_id: int) -> bool:
+    """Check if user is in the config admins list, also in DEMO_MODE (for commands that change data)"""
+    admin_ids = get_config().get('admins', [])
     return user_id in admin_ids
 
 
@@ -32,8 +58,10 @@ async def cmd_admin(message: Message):
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="👥 Список зарегистрированных", callback_data="admin_registered")],
         [InlineKeyboardButton(text="📊 Общая статистика", callback_data="admin_stats")],
+        [InlineKeyboardButton(text="📈 Динамика", callback_data="admin_trends")],
         [InlineKeyboardButton(text="📂 Экспорт базы", callback_data="admin_export")],
-        [InlineKeyboardButton(text="📋 Регистрации на встречи", callback_data="admin_meeting_regs")]
+        [InlineKeyboardButton(text="📋 Регистрации на встречи", callback_data="admin_meeting_regs")],
+        [InlineKeyboardButton(text="📡 Ход рассылки", callback_data="admin_broadcast")]
     ])
     
     demo_notice = "🧪 <b>DEMO MODE</b> - Админ-панель доступна всем\n\n" if DEMO_MODE else ""
@@ -60,6 +88,47 @@ async def cmd_myid(message: Message):
     )
 
 
+@router.message(Command("find"))
+async def cmd_find_user(message: Message, command: CommandObject):
+    """Search users by name or username prefix"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+    
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer(
+            "🔎 Использование: <code>/find имя или @username</code>",
+            parse_mode="HTML"
+        )
+        return
+    
+    results = user_repo.search_users(query, limit=SEARCH_LIMIT)
+    
+    if not results:
+        await message.answer(f"🔎 По запросу «{html.quote(query)}» никого не найдено.")
+        return
+    
+    text = f"🔎 <b>Результаты поиска</b> «{html.quote(query)}»\n\n"
+    
+    for user, registrations in results:
+        username_str = f"@{user.username}" if user.username else "без username"
+        full_name = f"{user.first_name or ''} {user.last_name or ''}".strip()
+        status = "активен" if user.is_active else "отписан"
+        text += f"👤 {html.quote(full_name)} ({html.quote(username_str)}), {status}\n"
+        text += f"   ID: <code>{user.tg_id}</code>\n"
+        
+        for reg in registrations:
+            formatted_date = format_date(reg.meeting_date)
+            status_emoji = "✅" if reg.status == "registered" else "❌"
+            text += f"   {status_emoji} {formatted_date}\n"
+        
+        text += "\n"
+    
+    await message.answer(text, parse_mode="HTML")
+    logger.info(f"User search by admin {message.from_user.id}: {len(results)} results")
+
+
 @router.callback_query(F.data == "admin_registered")
 async def admin_show_registered(callback: CallbackQuery):
     """Show list of registered users"""
@@ -94,24 +163,33 @@ async def admin_show_stats(callback: CallbackQuery):
         await callback.answer("❌ Нет доступа")
         return
     
-    # Get user statistics
+    # Get user statistics (one read transaction, so all counts agree with each other)
     conn = user_repo._get_connection()
     cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total_users = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE is_registered = 1")
-    registered_users = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 0")
-    unsubscribed_users = cursor.fetchone()[0]
+    cursor.execute("BEGIN")
     
     cursor.execute("SELECT COUNT(*) FROM registrations")
     total_registrations = cursor.fetchone()[0]
     
-    cursor.execute("SELECT COUNT(DISTINCT user_id) FROM registrations WHERE status = 'registered'")
-    users_with_registrations = cursor.fetchone()[0]
+    index = get_audience_index(current_db_path())
+    if index:
+        # User counts are bit counts of the audience index
+        total_users = len(index.tg_ids)
+        registered_users = index.registered.bit_count()
+        unsubscribed_users = total_users - index.active.bit_count()
+        users_with_registrations = index.with_registrations().bit_count()
+    else:
+        cursor.execute("SELECT COUNT(*) FROM users")
+        total_users = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT COUNT(*) FROM users WHERE is_registered = 1")
+        registered_users = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 0")
+        unsubscribed_users = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT COUNT(DISTINCT user_id) FROM registrations WHERE status = 'registered'")
+        users_with_registrations = cursor.fetchone()[0]
     
     conn.close()
     
@@ -128,6 +206,54 @@ async def admin_show_stats(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.callback_query(F.data == "admin_trends")
+async def admin_show_trends(callback: CallbackQuery):
+    """Show daily trends from pre-aggregated rollups"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа")
+        return
+    
+    daily = {}
+    for day, metric, value in stats_repo.get_daily_totals(TRENDS_DAYS):
+        daily.setdefault(day, {})[metric] = value
+    
+    text = f"📈 <b>Динамика за {TRENDS_DAYS} дней</b>\n\n"
+    
+    if daily:
+        text += "<b>День: новые / отписки / записи</b>\n"
+        for day, metrics in daily.items():
+            formatted_day = format_date(day, '%d.%m')
+            unsubscribes = metrics.get('unsubscribes', 0) + metrics.get('unreachable', 0)
+            text += (f"   {formatted_day}: +{metrics.get('new_users', 0)} / "
+                     f"−{unsubscribes} / {metrics.get('registrations', 0)}\n")
+    else:
+        text += "   Нет данных за период\n"
+    
+    since = (datetime.now().date() - timedelta(days=TRENDS_DAYS * 4)).isoformat()
+    weeks = {}
+    meetings = {}
+    for metric, dimension, value in stats_repo.get_totals_by_dimension(
+            ['response_yes', 'response_no', 'registrations'], since):
+        if metric == 'registrations':
+            meetings[dimension] = value
+        else:
+            weeks.setdefault(dimension, {})[metric] = value
+    
+    if weeks:
+        text += "\n<b>Ответы на приглашения (неделя: да / нет)</b>\n"
+        for week, metrics in weeks.items():
+            formatted_week = format_date(week, '%d.%m')
+            text += f"   {formatted_week}: {metrics.get('response_yes', 0)} / {metrics.get('response_no', 0)}\n"
+    
+    if meetings:
+        text += "\n<b>Записи по встречам</b>\n"
+        for meeting_date, value in meetings.items():
+            text += f"   {format_date(meeting_date)}: {value}\n"
+    
+    await callback.message.edit_text(text, parse_mode="HTML")
+    await callback.answer()
+
+
 @router.callback_query(F.data == "admin_meeting_regs")
 async def admin_show_meeting_registrations(callback: CallbackQuery):
     """Show registrations for upcoming meetings"""
@@ -135,22 +261,12 @@ async def admin_show_meeting_registrations(callback: CallbackQuery):
         await callback.answer("❌ Нет доступа")
         return
     
-    meetings = config.get('upcoming_meetings', [])
-    today = datetime.now().date()
-    
     text = "📋 <b>Регистрации на встречи</b>\n\n"
     
-    for meeting in meetings:
-        meeting_date_obj = datetime.strptime(meeting['date'], '%Y-%m-%d').date()
-        
-        # Skip past meetings
-        if meeting_date_obj < today:
-            continue
+    for meeting in get_meetings_catalog().upcoming():
+        registrations = registration_repo.get_meeting_registrations(meeting.date)
         
-        formatted_date = meeting_date_obj.strftime('%d.%m.%Y')
-        registrations = registration_repo.get_meeting_registrations(meeting['date'])
-        
-        text += f"📅 <b>{formatted_date}</b> - {meeting['topic']}\n"
+        text += f"📅 <b>{meeting.full_date}</b> - {meeting.topic}\n"
         
         if registrations:
             text += f"   Записано: {len(registrations)} чел.\n"
@@ -166,6 +282,81 @@ async def admin_show_meeting_registrations(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.message(Command("backup"))
+async def cmd_backup(message: Message):
+    """Create online database backup"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+    
+    keep = get_config().get('backup', {}).get('keep', 7)
+    backup_path = await asyncio.to_thread(backup_database, keep)
+    size_kb = backup_path.stat().st_size / 1024
+    
+    await message.answer(
+        f"💾 Резервная копия создана: <code>{backup_path.name}</code> ({size_kb:.0f} КБ)",
+        parse_mode="HTML"
+    )
+    logger.info(f"Database backup requested by admin {message.from_user.id}")
+
+
+@router.message(Command("import"), F.document)
+async def cmd_import(message: Message):
+    """Bulk import users or registrations from CSV sent with /import caption"""
+    if not is_configured_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+    
+    status_message = await message.answer("⏳ Импортирую данные...")
+    
+    try:
+        data = BytesIO()
+        await message.bot.download(message.document, destination=data)
+        data.seek(0)
+        report = await asyncio.to_thread(import_csv, TextIOWrapper(data, encoding='utf-8-sig', newline=''))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        await status_message.edit_text(f"❌ Не удалось импортировать файл: {e}")
+        return
+    except Exception as e:
+        # Database or network error: chunks committed before it stay imported
+        logger.error(f"CSV import by admin {message.from_user.id} failed: {e}")
+        await status_message.edit_text("❌ Импорт прерван из-за ошибки. Часть строк могла быть уже записана.")
+        return
+    
+    await status_message.edit_text(
+        f"✅ <b>Импорт завершён</b>\n\n"
+        f"👥 Пользователей: {report.users_count}\n"
+        f"📝 Регистраций: {report.registrations_count}\n"
+        f"⚠️ Пропущено строк: {report.skipped_count}\n"
+        f"⚡ {report.rows_per_sec:.0f} строк/с",
+        parse_mode="HTML"
+    )
+    logger.info(f"CSV import by admin {message.from_user.id}: {report}")
+
+
+@router.message(Command("import"))
+async def cmd_import_help(message: Message):
+    """Explain how to use CSV import"""
+    if not is_configured_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+    
+    await message.answer(
+        "📥 Отправьте CSV-файл с подписью <code>/import</code>.\n\n"
+        "Поддерживаются файлы экспорта бота (пользователи и регистрации) "
+        "и списки подписчиков с колонкой TG_ID.",
+        parse_mode="HTML"
+    )
+
+
+def _read_export_data():
+    """Read export data from a point-in-time snapshot of the database"""
+    with open_snapshot() as snapshot_path:
+        users = UserRepository(snapshot_path).get_all_registered_users()
+        registrations = RegistrationRepository(snapshot_path).get_all_registrations_with_users()
+    return users, registrations
+
+
 @router.callback_query(F.data == "admin_export")
 async def admin_export_data(callback: CallbackQuery):
     """Export data to CSV"""
@@ -175,8 +366,8 @@ async def admin_export_data(callback: CallbackQuery):
     
     await callback.message.edit_text("⏳ Экспортирую данные...")
     
-    # Export users
-    users = user_repo.get_all_registered_users()
+    # Users and registrations come from one consistent snapshot, read off the event loop
+    users, registrations = await asyncio.to_thread(_read_export_data)
     
     # Create users CSV
     users_csv = StringIO()
@@ -193,9 +384,6 @@ async def admin_export_data(callback: CallbackQuery):
             'Да' if user.is_registered else 'Нет'
         ])
     
-    # Export registrations
-    registrations = registration_repo.get_all_registrations_with_users()
-    
     regs_csv = StringIO()
     regs_writer = csv.writer(regs_csv)
     regs_writer.writerow(['TG_ID', 'First Name', 'Username', 'Meeting Date', 'Status', 'Registered At'])
@@ -238,3 +426,119 @@ async def admin_export_data(callback: CallbackQuery):
     
     logger.info(f"Data exported by admin {callback.from_user.id}")
 
+
+
+def _format_duration(seconds: float) -> str:
+    """Format duration as 'N мин M с'"""
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes} мин {seconds} с" if minutes else f"{seconds} с"
+
+
+def format_broadcast_progress() -> str:
+    """Build progress text for the latest broadcast from in-memory counters"""
+    result = broadcast.get_current_broadcast()
+    if result is None:
+        return "📡 С момента запуска бота рассылок не было."
+    
+    status = "идёт" if result.is_running else "завершена"
+    eta = result.eta
+    eta_str = _format_duration(eta) if eta is not None else "—"
+    
+    text = f"📡 <b>Рассылка: {result.name}</b> ({status})\n\n"
+    text += f"✅ Отправлено: {result.success_count}\n"
+    text += f"❌ Ошибок: {result.error_count}\n"
+    if result.retrying:
+        text += f"🔁 Ждут повтора: {result.retrying}\n"
+    text += f"⏳ Осталось: {result.remaining} из {result.total}\n"
+    if result.skipped:
+        text += f"⏭ Пропущено (уже записаны): {result.skipped}\n"
+    text += f"⚡ Скорость: {result.rate:.1f} сообщ./с\n"
+    text += f"🕐 До завершения: {eta_str}\n"
+    text += f"⏱ Прошло: {_format_duration(result.elapsed)}"
+    return text
+
+
+async def _watch_broadcast(message: Message, text: str):
+    """Keep progress message up to date until the broadcast finishes"""
+    try:
+        result = broadcast.get_current_broadcast()
+        while result is not None and result.is_running:
+            await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
+            result = broadcast.get_current_broadcast()
+            new_text = format_broadcast_progress()
+            # Skip edits that would not change anything
+            if new_text != text:
+                await message.edit_text(new_text, parse_mode="HTML")
+                text = new_text
+    except Exception as e:
+        logger.warning(f"Stopped broadcast progress updates in chat {message.chat.id}: {e}")
+    finally:
+        _progress_watchers.pop((message.chat.id, message.message_id), None)
+
+
+def _start_progress_watcher(message: Message, text: str):
+    """Start updating progress message, at most one updater per message"""
+    key = (message.chat.id, message.message_id)
+    if key not in _progress_watchers:
+        _progress_watchers[key] = asyncio.create_task(_watch_broadcast(message, text))
+
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast_progress(message: Message):
+    """Show progress of the current broadcast"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+    
+    text = format_broadcast_progress()
+    progress_message = await message.answer(text, parse_mode="HTML")
+    _start_progress_watcher(progress_message, text)
+
+
+@router.callback_query(F.data == "admin_broadcast")
+async def admin_show_broadcast_progress(callback: CallbackQuery):
+    """Show progress of the current broadcast"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа")
+        return
+    
+    text = format_broadcast_progress()
+    if text != callback.message.html_text:
+        await callback.message.edit_text(text, parse_mode="HTML")
+    _start_progress_watcher(callback.message, text)
+    await callback.answer()
+
+
+async def _replay_dead_letters(message: Message, count: int):
+    """Replay dead letters and report the result"""
+    try:
+        await message.answer(f"⏳ Повторяю отправку {count} сообщений. Ход: /broadcast")
+        replayed = await broadcast.replay_dead_letters(message.bot)
+        await message.answer(f"🔁 Повторно отправлено недоставленных сообщений: {replayed}")
+    except Exception as e:
+        logger.error(f"Dead letter replay failed: {e}")
+        await message.answer(f"❌ Не удалось повторить отправку: {e}")
+
+
+@router.message(Command("replay_dead"))
+async def cmd_replay_dead(message: Message):
+    """Send failed deliveries again"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+    
+    tenant_name = current_tenant.get().name
+    if tenant_name in _dead_letter_replays:
+        await message.answer("⏳ Повторная отправка уже идёт. Ход: /broadcast")
+        return
+    
+    count = dead_letter_repo.count()
+    if not count:
+        await message.answer("📭 Недоставленных сообщений нет.")
+        return
+    
+    logger.info(f"Dead letter replay requested by admin {message.from_user.id}")
+    # Registered before any await, so a second /replay_dead sees it; the reference keeps the task alive.
+    # Replay may take a while, do not block the update
+    task = _dead_letter_replays[tenant_name] = asyncio.create_task(_replay_dead_letters(message, count))
+    task.add_done_callback(lambda _: _dead_letter_replays.pop(tenant_name, None))
@@ -1,34 +1,27 @@
 """Meetings handler for viewing and registering for meetings"""
 import logging
 from datetime import datetime
-from aiogram import Router, F
+from typing import List
+from aiogram import Bot, Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from bot.data.database import user_repo, registration_repo
-from config import config
+from bot.data.meetings import format_date, get_meetings_catalog
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-
-def get_upcoming_meetings():
-    """Get list of upcoming meetings"""
-    meetings = config.get('upcoming_meetings', [])
-    today = datetime.now().date()
-    
-    # Filter only future meetings
-    upcoming = []
-    for meeting in meetings:
-        meeting_date = datetime.strptime(meeting['date'], '%Y-%m-%d').date()
-        if meeting_date >= today:
-            upcoming.append(meeting)
-    
-    return upcoming
+# Registration status -> emoji in "my meetings"
+STATUS_EMOJI = {
+    "registered": "✅",
+    "waitlisted": "⏳",
+    "cancelled": "❌",
+}
 
 
 @router.message(F.text == "📅 Ближайшие встречи")
 async def show_upcoming_meetings(message: Message):
     """Show list of upcoming meetings"""
-    meetings = get_upcoming_meetings()
+    meetings = get_meetings_catalog().upcoming()
     
     if not meetings:
         await message.answer("На данный момент нет запланированных встреч.")
@@ -37,24 +30,8 @@ async def show_upcoming_meetings(message: Message):
     text = "📅 <b>Ближайшие встречи</b>\n\n"
     
     for meeting in meetings:
-        meeting_date = datetime.strptime(meeting['date'], '%Y-%m-%d')
-        formatted_date = meeting_date.strftime('%d.%m.%Y (%A)')
-        
-        # Translate day name to Russian
-        day_names = {
-            'Monday': 'Понедельник',
-            'Tuesday': 'Вторник',
-            'Wednesday': 'Среда',
-            'Thursday': 'Четверг',
-            'Friday': 'Пятница',
-            'Saturday': 'Суббота',
-            'Sunday': 'Воскресенье'
-        }
-        for en, ru in day_names.items():
-            formatted_date = formatted_date.replace(en, ru)
-        
-        text += f"📌 <b>{formatted_date} в {meeting['time']}</b>\n"
-        text += f"   {meeting['topic']}\n\n"
+        text += f"📌 <b>{meeting.weekday_date} в {meeting.time}</b>\n"
+        text += f"   {meeting.topic}\n\n"
     
     await message.answer(text, parse_mode="HTML")
 
@@ -69,7 +46,9 @@ async def show_my_meetings(message: Message):
         await message.answer("Вы не зарегистрированы. Отправьте /start")
         return
     
-    registrations = registration_repo.get_user_registrations(user.id)
+    # Past meetings are filtered out in SQL
+    today = datetime.now().date()
+    registrations = registration_repo.get_user_registrations(user.id, since_date=today.isoformat())
     
     if not registrations:
         await message.answer(
@@ -78,39 +57,34 @@ async def show_my_meetings(message: Message):
         )
         return
     
-    # Get meeting details from config
-    meetings_dict = {}
-    for meeting in config.get('upcoming_meetings', []):
-        meetings_dict[meeting['date']] = meeting
+    catalog = get_meetings_catalog()
     
     text = "🔔 <b>Ваши встречи</b>\n\n"
     
-    today = datetime.now().date()
-    active_count = 0
+    cancel_buttons = []
     
     for reg in registrations:
-        meeting_date = datetime.strptime(reg.meeting_date, '%Y-%m-%d').date()
-        
-        # Skip past meetings
-        if meeting_date < today:
-            continue
-        
-        active_count += 1
-        formatted_date = datetime.strptime(reg.meeting_date, '%Y-%m-%d').strftime('%d.%m.%Y')
+        # Meetings removed from config keep the default topic and time
+        meeting = catalog.get(reg.meeting_date)
+        formatted_date = meeting.full_date if meeting else format_date(reg.meeting_date)
+        topic = meeting.topic if meeting else 'Встреча'
+        time = meeting.time if meeting else '11:00'
         
-        meeting_info = meetings_dict.get(reg.meeting_date, {})
-        topic = meeting_info.get('topic', 'Встреча')
-        time = meeting_info.get('time', '11:00')
-        
-        status_emoji = "✅" if reg.status == "registered" else "❌"
+        status_emoji = STATUS_EMOJI.get(reg.status, "❌")
         
         text += f"{status_emoji} <b>{formatted_date} в {time}</b>\n"
+        if reg.status == "waitlisted":
+            text += "   В листе ожидания\n"
         text += f"   {topic}\n\n"
+        
+        if reg.status != "cancelled":
+            cancel_buttons.append([InlineKeyboardButton(
+                text=f"❌ Отменить запись на {formatted_date[:5]}",
+                callback_data=f"cancel:{reg.meeting_date}"
+            )])
     
-    if active_count == 0:
-        await message.answer("У вас нет предстоящих встреч.")
-    else:
-        await message.answer(text, parse_mode="HTML")
+    keyboard = InlineKeyboardMarkup(inline_keyboard=cancel_buttons) if cancel_buttons else None
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
 
 
 @router.message(F.text == "📝 Записаться на встречу")
@@ -123,7 +97,7 @@ async def register_for_meeting_menu(message: Message):
         await message.answer("Вы не зарегистрированы. Отправьте /start")
         return
     
-    meetings = get_upcoming_meetings()
+    meetings = get_meetings_catalog().upcoming()
     
     if not meetings:
         await message.answer("На данный момент нет доступных встреч для записи.")
@@ -133,18 +107,18 @@ async def register_for_meeting_menu(message: Message):
     keyboard_buttons = []
     
     for meeting in meetings:
-        meeting_date = datetime.strptime(meeting['date'], '%Y-%m-%d')
-        formatted_date = meeting_date.strftime('%d.%m')
+        # Check if already registered or waitlisted
+        status = registration_repo.get_registration_status(user.id, meeting.date)
         
-        # Check if already registered
-        is_registered = registration_repo.is_registered(user.id, meeting['date'])
-        
-        if is_registered:
-            button_text = f"✅ {formatted_date} - {meeting['topic'][:30]}..."
-            callback_data = f"already_registered:{meeting['date']}"
+        if status == "registered":
+            button_text = f"✅ {meeting.short_date} - {meeting.topic[:30]}..."
+            callback_data = f"already_registered:{meeting.date}"
+        elif status == "waitlisted":
+            button_text = f"⏳ {meeting.short_date} - {meeting.topic[:30]}..."
+            callback_data = f"already_registered:{meeting.date}"
         else:
-            button_text = f"📝 {formatted_date} - {meeting['topic'][:30]}..."
-            callback_data = f"register:{meeting['date']}"
+            button_text = f"📝 {meeting.short_date} - {meeting.topic[:30]}..."
+            callback_data = f"register:{meeting.date}"
         
         keyboard_buttons.append([InlineKeyboardButton(
             text=button_text,
@@ -156,48 +130,70 @@ async def register_for_meeting_menu(message: Message):
     await message.answer(
         "📝 <b>Выберите встречу для записи:</b>\n\n"
         "✅ - вы уже записаны\n"
+        "⏳ - вы в листе ожидания\n"
         "📝 - нажмите для записи",
         reply_markup=keyboard,
         parse_mode="HTML"
     )
 
 
+async def notify_promoted(bot: Bot, promoted: List[int], meeting_date: str):
+    """Tell users moved from the waitlist that they got a seat"""
+    formatted_date = format_date(meeting_date)
+    for promoted_tg_id in promoted:
+        try:
+            await bot.send_message(
+                chat_id=promoted_tg_id,
+                text=f"🎉 Освободилось место! Вы записаны на встречу {formatted_date}."
+            )
+        except Exception as e:
+            logger.error(f"Failed to notify user {promoted_tg_id} about waitlist promotion: {e}")
+
+
 @router.callback_query(F.data.startswith("register:"))
 async def register_for_meeting(callback: CallbackQuery):
     """Register user for a meeting"""
     tg_id = callback.from_user.id
-    user = user_repo.get_user_by_tg_id(tg_id)
-    
-    if not user:
-        await callback.answer("Ошибка: пользователь не найден")
-        return
-    
     meeting_date = callback.data.split(":")[1]
     
-    # Create registration
-    result = registration_repo.create_registration(user.id, meeting_date)
+    # Get meeting info
+    meeting = get_meetings_catalog().get(meeting_date)
+    capacity = meeting.capacity if meeting else None
     
-    if result:
-        # Get meeting info
-        meetings = config.get('upcoming_meetings', [])
-        meeting_info = next((m for m in meetings if m['date'] == meeting_date), None)
-        
-        if meeting_info:
-            formatted_date = datetime.strptime(meeting_date, '%Y-%m-%d').strftime('%d.%m.%Y')
-            
+    # Create registration (takes a seat or a waitlist place for limited meetings)
+    result = registration_repo.register_by_tg_id(tg_id, meeting_date, capacity)
+    
+    if result and result.status == "waitlisted":
+        formatted_date = meeting.full_date if meeting else format_date(meeting_date)
+        await callback.message.edit_text(
+            f"⏳ <b>Все места на {formatted_date} заняты</b>\n\n"
+            f"Вы в листе ожидания. Если место освободится, вы будете записаны автоматически "
+            f"и получите уведомление.",
+            parse_mode="HTML"
+        )
+        logger.info(f"User {tg_id} waitlisted for meeting {meeting_date}")
+        await callback.answer("Вы в листе ожидания")
+    elif result:
+        if meeting:
             await callback.message.edit_text(
                 f"✅ <b>Вы записаны!</b>\n\n"
-                f"📅 Дата: {formatted_date}\n"
-                f"🕐 Время: {meeting_info['time']}\n"
-                f"📌 Тема: {meeting_info['topic']}\n\n"
+                f"📅 Дата: {meeting.full_date}\n"
+                f"🕐 Время: {meeting.time}\n"
+                f"📌 Тема: {meeting.topic}\n\n"
                 f"Мы напомним вам о встрече перед началом.",
                 parse_mode="HTML"
             )
         
         logger.info(f"User {tg_id} registered for meeting {meeting_date}")
         await callback.answer("Вы успешно записаны!")
+    elif not user_repo.get_user_by_tg_id(tg_id):
+        await callback.answer("Ошибка: пользователь не найден")
     else:
         await callback.answer("Вы уже записаны на эту встречу")
+    
+    if result and result.promoted:
+        # Capacity was raised in config, the added seats went to the waitlist first
+        await notify_promoted(callback.bot, result.promoted, meeting_date)
 
 
 @router.callback_query(F.data.startswith("already_registered:"))
@@ -206,14 +202,37 @@ async def already_registered(callback: CallbackQuery):
     await callback.answer("Вы уже записаны на эту встречу ✅")
 
 
+@router.callback_query(F.data.startswith("cancel:"))
+async def cancel_meeting_registration(callback: CallbackQuery):
+    """Cancel registration and notify users promoted from the waitlist"""
+    tg_id = callback.from_user.id
+    user = user_repo.get_user_by_tg_id(tg_id)
+    
+    if not user:
+        await callback.answer("Ошибка: пользователь не найден")
+        return
+    
+    meeting_date = callback.data.split(":")[1]
+    cancelled, promoted = registration_repo.cancel_registration(user.id, meeting_date)
+    
+    if not cancelled:
+        await callback.answer("Запись уже отменена")
+        return
+    
+    formatted_date = format_date(meeting_date)
+    await callback.message.answer(f"❌ Запись на встречу {formatted_date} отменена.")
+    await callback.answer()
+    logger.info(f"User {tg_id} cancelled registration for {meeting_date}, promoted: {len(promoted)}")
+    
+    await notify_promoted(callback.bot, promoted, meeting_date)
+
+
 @router.message(F.text == "🚫 Отписаться")
 async def unsubscribe(message: Message):
     """Unsubscribe from newsletters"""
     tg_id = message.from_user.id
-    user = user_repo.get_user_by_tg_id(tg_id)
     
-    if user:
-        user_repo.update_user(tg_id, is_active=False, is_registered=False)
+    if user_repo.update_user(tg_id, is_active=False, is_registered=False):
         logger.info(f"User {tg_id} unsubscribed")
         await message.answer(
             "🚫 Вы отписались от рассылок.\n\n"
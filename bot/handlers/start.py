@@ -1,13 +1,19 @@
 """Start and stop command handlers"""
 import logging
-from aiogram import Router, F
-from aiogram.filters import Command
+import pytz
+from aiogram import Router, F, html
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from bot.data.database import user_repo
+from bot.data.database import user_repo, response_repo
+from bot.scheduler.notifications import get_current_meeting_date, get_timezone, sync_invitation_jobs
+from config import get_config
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Lowercase name -> canonical tz database name, so "europe/berlin" is accepted
+TIMEZONE_NAMES = {name.lower(): name for name in pytz.all_timezones}
+
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
@@ -17,23 +23,18 @@ async def cmd_start(message: Message):
     last_name = message.from_user.last_name
     username = message.from_user.username
     
-    # Check if user exists
-    user = user_repo.get_user_by_tg_id(tg_id)
+    # Create user or reactivate if they were inactive (one atomic statement)
+    _, outcome = user_repo.upsert_user(
+        tg_id=tg_id,
+        first_name=first_name,
+        last_name=last_name,
+        username=username
+    )
     
-    if not user:
-        # Create new user
-        user_repo.create_user(
-            tg_id=tg_id,
-            first_name=first_name,
-            last_name=last_name,
-            username=username
-        )
+    if outcome == 'created':
         logger.info(f"New user created: {tg_id} (@{username})")
-    else:
-        # Reactivate user if they were inactive
-        if not user.is_active:
-            user_repo.update_user(tg_id, is_active=True)
-            logger.info(f"User reactivated: {tg_id} (@{username})")
+    elif outcome == 'reactivated':
+        logger.info(f"User reactivated: {tg_id} (@{username})")
     
     # Send welcome message with buttons
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -58,16 +59,49 @@ async def cmd_stop(message: Message):
     """Handle /stop command"""
     tg_id = message.from_user.id
     
-    user = user_repo.get_user_by_tg_id(tg_id)
-    
-    if user:
-        user_repo.update_user(tg_id, is_active=False)
+    if user_repo.update_user(tg_id, is_active=False):
         logger.info(f"User unsubscribed: {tg_id}")
         await message.answer("Вы отписались. Возвращайтесь, когда будете готовы 🙂")
     else:
         await message.answer("Вы не были зарегистрированы. Используйте /start для начала.")
 
 
+@router.message(Command("timezone"))
+async def cmd_timezone(message: Message, command: CommandObject):
+    """Show or set the time zone invitations are delivered in"""
+    tg_id = message.from_user.id
+    
+    if not command.args:
+        user = user_repo.get_user_by_tg_id(tg_id)
+        current = user.timezone if user and user.timezone else get_timezone().zone
+        invitation_time = get_config()['schedule']['invitation_time']
+        await message.answer(
+            f"🕐 Ваш часовой пояс: <b>{current}</b>\n\n"
+            f"Приглашения приходят в {invitation_time} по вашему времени. Чтобы изменить пояс, "
+            f"отправьте, например: <code>/timezone Europe/Berlin</code>",
+            parse_mode="HTML"
+        )
+        return
+    
+    timezone = TIMEZONE_NAMES.get(command.args.strip().lower())
+    if timezone is None:
+        await message.answer(
+            f"❌ Неизвестный часовой пояс: {html.quote(command.args.strip())}\n"
+            f"Используйте формат <code>Europe/Moscow</code>, <code>Asia/Almaty</code> и т.п.",
+            parse_mode="HTML"
+        )
+        return
+    
+    if not user_repo.update_user(tg_id, timezone=timezone):
+        await message.answer("Вы не зарегистрированы. Используйте /start для начала.")
+        return
+    
+    # Make sure the time zone bucket has its invitation job
+    sync_invitation_jobs(message.bot)
+    logger.info(f"User {tg_id} set time zone {timezone}")
+    await message.answer(f"✅ Часовой пояс изменён на <b>{timezone}</b>", parse_mode="HTML")
+
+
 @router.callback_query(F.data == "register_yes")
 async def register_yes(callback: CallbackQuery):
     """Handle 'Yes' button for registration"""
@@ -107,12 +141,18 @@ async def register_no(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "meeting_yes")
+def _response_meeting_date(callback_data: str) -> str:
+    """Meeting date from `meeting_yes:<date>`; older invitations carry no date"""
+    _, _, meeting_date = callback_data.partition(":")
+    return meeting_date or get_current_meeting_date()
+
+
+@router.callback_query(F.data.startswith("meeting_yes"))
 async def meeting_yes(callback: CallbackQuery):
     """Handle 'Yes, I will come' button"""
     tg_id = callback.from_user.id
     
-    user_repo.update_user(tg_id, last_response="yes")
+    response_repo.record(tg_id, _response_meeting_date(callback.data), "yes")
     logger.info(f"User confirmed attendance: {tg_id}")
     
     await callback.message.edit_text(
@@ -122,12 +162,12 @@ async def meeting_yes(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "meeting_no")
+@router.callback_query(F.data.startswith("meeting_no"))
 async def meeting_no(callback: CallbackQuery):
     """Handle 'No, I cannot come' button"""
     tg_id = callback.from_user.id
     
-    user_repo.update_user(tg_id, last_response="no")
+    response_repo.record(tg_id, _response_meeting_date(callback.data), "no")
     logger.info(f"User declined attendance: {tg_id}")
     
     await callback.message.edit_text(
@@ -0,0 +1,54 @@
+"""Middleware that collapses duplicate callback queries"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackDebounceMiddleware(BaseMiddleware):
+    """Answer repeated identical callbacks without running the handler again.
+
+    A callback is a duplicate when the same user presses the same button
+    (same message, same data) within `window` seconds of the first press.
+    Seen callbacks are kept as hash -> timestamp in an LRU of at most
+    `max_entries` items, so memory stays bounded under a flood of taps.
+    """
+
+    def __init__(self, window: float = 2.0, max_entries: int = 10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self.duplicates = 0
+
+    def _is_duplicate(self, key: int, now: float) -> bool:
+        """Check and remember callback key"""
+        seen_at = self._seen.get(key)
+        if seen_at is not None and now - seen_at < self.window:
+            return True
+        
+        self._seen[key] = now
+        self._seen.move_to_end(key)
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        message_id = event.message.message_id if event.message else event.inline_message_id
+        key = hash((event.from_user.id, message_id, event.data))
+        
+        if self._is_duplicate(key, time.monotonic()):
+            self.duplicates += 1
+            logger.debug(f"Duplicate callback {event.data!r} from {event.from_user.id} ignored")
+            await event.answer()
+            return None
+        
+        return await handler(event, data)
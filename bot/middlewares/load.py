@@ -0,0 +1,47 @@
+"""Inbound load monitoring middleware"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class LoadMonitor(BaseMiddleware):
+    """Track updates being handled and smoothed handler latency.
+
+    Registered as an outer update middleware, so with concurrent polling
+    `in_flight` is the backlog of updates the bot has not finished yet.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.handled = 0
+        self._latency = 0.0
+        self._sampled_at = 0.0
+
+    def latency(self, max_age: float = 10.0) -> float:
+        """Smoothed handler latency in seconds, 0 if nothing was handled recently"""
+        if time.monotonic() - self._sampled_at > max_age:
+            return 0.0
+        return self._latency
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        self.in_flight += 1
+        started_at = time.monotonic()
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self.handled += 1
+            self._sampled_at = time.monotonic()
+            elapsed = self._sampled_at - started_at
+            self._latency += self.smoothing * (elapsed - self._latency)
+
+
+# Shared by the dispatcher and broadcast pacing
+load_monitor = LoadMonitor()
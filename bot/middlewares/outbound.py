@@ -0,0 +1,137 @@
+"""Priority scheduling of outbound Bot API requests"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+
+logger = logging.getLogger(__name__)
+
+
+class SendPriority(IntEnum):
+    """Priority class of outbound requests, lower value is served first"""
+    INTERACTIVE = 0
+    REMINDER = 1
+    INVITATION = 2
+
+
+# Priority of requests made from the current task; handlers keep the default
+current_priority: ContextVar[SendPriority] = ContextVar('current_priority', default=SendPriority.INTERACTIVE)
+
+
+@contextmanager
+def send_priority(priority: SendPriority):
+    """Make requests inside the block with given priority"""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class RateBudget:
+    """Rate budget of one bot.
+
+    Requests wait in a priority queue and take tokens from a bucket of `rate`
+    tokens per second and `burst` capacity. Bulk priorities may only take a
+    token while more than `reserve` tokens are left, so interactive replies
+    always find headroom even when a broadcast saturates the budget.
+    """
+
+    def __init__(self, rate: float = 25.0, burst: float = 25.0, reserve: float = 5.0):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(reserve, burst - 1)
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _needed(self, priority: SendPriority) -> float:
+        """Tokens that must be available for priority to take one"""
+        return 1 if priority == SendPriority.INTERACTIVE else self.reserve + 1
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for budget"""
+        return len(self._waiters)
+
+    async def acquire(self, priority: SendPriority):
+        """Wait until a request of given priority may be sent"""
+        self._refill(time.monotonic())
+        if not self._waiters and self._tokens >= self._needed(priority):
+            self._tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        await future
+
+    async def _run(self):
+        """Hand out tokens to waiters in priority order"""
+        while True:
+            # Drop requests cancelled while waiting
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            priority, _, future = self._waiters[0]
+            self._refill(time.monotonic())
+            missing = self._needed(priority) - self._tokens
+            if missing > 0:
+                # Sleep until enough tokens, or until a more urgent request arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), missing / self.rate)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            future.set_result(None)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Put outbound requests through the rate budget of the bot making them.
+
+    One scheduler can serve a session shared by several bots, Telegram limits
+    are per bot. Long polling (getUpdates) bypasses the queue.
+    """
+
+    def __init__(self, rate: float = 25.0, burst: float = 25.0, reserve: float = 5.0):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        # Bot id -> budget
+        self.budgets = {}
+
+    def budget(self, bot_id: int) -> RateBudget:
+        """Get rate budget of a bot"""
+        budget = self.budgets.get(bot_id)
+        if budget is None:
+            budget = self.budgets[bot_id] = RateBudget(self.rate, self.burst, self.reserve)
+        return budget
+
+    async def __call__(self, make_request, bot, method):
+        if not isinstance(method, GetUpdates):
+            await self.budget(bot.id).acquire(current_priority.get())
+        return await make_request(bot, method)
@@ -0,0 +1,130 @@
+"""Recording of incoming updates for replay"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from config import current_tenant
+
+logger = logging.getLogger(__name__)
+
+# How a recorded field is written: as is, as a pseudonym (user and chat ids),
+# as a placeholder of the same length, or as text kept only for commands and buttons
+_KEEP, _ID, _PLACEHOLDER, _TEXT = 'keep', 'id', 'placeholder', 'text'
+
+# Fields routing and handlers need; everything else is dropped. Required fields
+# of aiogram types (first_name, file_id, chat_instance) stay as placeholders
+_USER = {'id': _ID, 'is_bot': _KEEP, 'first_name': _PLACEHOLDER}
+_CHAT = {'id': _ID, 'type': _KEEP}
+_DOCUMENT = {'file_id': _PLACEHOLDER, 'file_unique_id': _PLACEHOLDER}
+_MESSAGE = {'message_id': _KEEP, 'date': _KEEP, 'chat': _CHAT, 'from': _USER,
+            'text': _TEXT, 'caption': _TEXT, 'document': _DOCUMENT}
+_CALLBACK_QUERY = {'id': _KEEP, 'from': _USER, 'chat_instance': _PLACEHOLDER, 'data': _KEEP, 'message': _MESSAGE}
+_UPDATE = {'update_id': _KEEP, 'message': _MESSAGE, 'edited_message': _MESSAGE, 'callback_query': _CALLBACK_QUERY}
+
+
+def open_recording(path: Path, mode: str):
+    """Open recording file, gzip-compressed if it ends with .gz"""
+    if path.suffix == '.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class UpdateRecorder(BaseMiddleware):
+    """Append incoming updates to a JSON Lines file with ids anonymized and text redacted.
+
+    Every line is `{"at": unix time, "bot": tenant name, "epoch": salt id, "update": {...}}`.
+    Only the fields in _UPDATE are written, other update kinds are not recorded.
+    User and chat ids are replaced by keyed hashes, stable while the salt is,
+    so one user's updates still belong together. The salt is new on every start
+    and lines of one salt share `epoch`; pseudonyms of different epochs do not
+    link. Texts are replaced by placeholders of the same length unless they are
+    a keyboard button text or a command (command arguments are redacted).
+    """
+
+    def __init__(self, path: Path, keep_texts: Iterable[str] = (), flush_every: int = 100):
+        self.path = path
+        self.keep_texts = set(keep_texts)
+        self.flush_every = flush_every
+        self.recorded = 0
+        # Hash key of this recording, pseudonyms do not link across recordings
+        self._salt = os.urandom(16)
+        self.epoch = hashlib.blake2b(self._salt, digest_size=4).hexdigest()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open_recording(path, 'a')
+        logger.info(f"Recording updates to {path}")
+
+    def _pseudonym(self, value: int) -> int:
+        digest = hashlib.blake2b(str(abs(value)).encode(), key=self._salt, digest_size=6).digest()
+        # Keep the sign: group chats have negative ids
+        pseudonym = int.from_bytes(digest, 'big') or 1
+        return -pseudonym if value < 0 else pseudonym
+
+    def _redact_text(self, text: str) -> str:
+        if text in self.keep_texts:
+            return text
+        if text.startswith('/'):
+            command, separator, arguments = text.partition(' ')
+            return command + separator + 'x' * len(arguments)
+        return 'x' * len(text)
+
+    def anonymize(self, value: Dict[str, Any], schema: Dict[str, Any] = _UPDATE) -> Dict[str, Any]:
+        """Copy of dumped update with only allowed fields, personal data replaced"""
+        result = {}
+        for key, rule in schema.items():
+            item = value.get(key)
+            if item is None:
+                continue
+            if isinstance(rule, dict):
+                if isinstance(item, dict):
+                    result[key] = self.anonymize(item, rule)
+            elif rule == _ID and isinstance(item, int):
+                result[key] = self._pseudonym(item)
+            elif rule == _PLACEHOLDER and isinstance(item, str):
+                result[key] = 'x' * len(item)
+            elif rule == _TEXT and isinstance(item, str):
+                result[key] = self._redact_text(item)
+            elif rule == _KEEP:
+                result[key] = item
+        return result
+
+    def record(self, update: Update):
+        """Append one update"""
+        dumped = update.model_dump(mode='json', exclude_none=True, by_alias=True)
+        anonymized = self.anonymize(dumped)
+        if anonymized.keys() == {'update_id'}:
+            # Update kind without handlers (chat member changes etc.)
+            return
+        line = json.dumps({
+            'at': round(time.time(), 3),
+            'bot': current_tenant.get().name,
+            'epoch': self.epoch,
+            'update': anonymized,
+        }, ensure_ascii=False, separators=(',', ':'))
+        self._file.write(line + '\n')
+        self.recorded += 1
+        if self.recorded % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        """Flush and close the file"""
+        self._file.close()
+        logger.info(f"Recorded {self.recorded} updates to {self.path}")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        try:
+            self.record(event)
+        except Exception as e:
+            # Recording must never break handling
+            logger.error(f"Failed to record update: {e}")
+        return await handler(event, data)
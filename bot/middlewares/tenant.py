@@ -0,0 +1,29 @@
+"""Tenant selection middleware"""
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from config import Tenant, use_tenant
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Run every update with the config and database of the bot that received it"""
+
+    def __init__(self):
+        # Bot id -> tenant
+        self.tenants: Dict[int, Tenant] = {}
+
+    def register(self, bot_id: int, tenant: Tenant):
+        self.tenants[bot_id] = tenant
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        tenant = self.tenants.get(data['bot'].id)
+        if tenant is None:
+            return await handler(event, data)
+        
+        with use_tenant(tenant):
+            return await handler(event, data)
@@ -0,0 +1,111 @@
+"""Per-user rate limiting middleware"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+SLOW_DOWN_TEXT = "⏳ Слишком много запросов. Подождите немного."
+
+
+class TokenBucket:
+    """Token bucket state; rate and capacity are passed in on every take"""
+    __slots__ = ('tokens', 'updated_at', 'warned')
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated_at = now
+        self.warned = False
+
+    def take(self, rate: float, capacity: float, now: float) -> bool:
+        """Refill by elapsed time and try to take one token"""
+        self.tokens = min(capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.warned = False
+            return True
+        return False
+
+
+def _command_key(event: TelegramObject) -> Optional[str]:
+    """Get limit name for event: command name or callback data prefix"""
+    if isinstance(event, Message):
+        # Documents carry the command in the caption (/import)
+        text = event.text or event.caption or ""
+        if not text.startswith("/"):
+            return None
+        parts = text[1:].split(maxsplit=1)
+        return parts[0].split("@")[0].lower() if parts else None
+    if isinstance(event, CallbackQuery) and event.data:
+        return event.data.split(":")[0]
+    return None
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Reject updates from users who exceed their rate limits.
+
+    Every update takes a token from the user's `default` bucket, and commands
+    or callbacks listed under `throttling.commands` in config.yaml also take
+    one from their own bucket. Buckets live in an LRU of at most `max_buckets`
+    entries. Throttled updates get a short answer and never reach repositories.
+    """
+
+    def __init__(self, max_buckets: int = 10000):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self.rejected = 0
+
+    def _take(self, user_id: int, name: str, limit, now: float) -> Optional[TokenBucket]:
+        """Take token from bucket; return bucket if it is empty"""
+        rate = float(limit.get('rate', 1))
+        capacity = float(limit.get('burst', 5))
+        key = (user_id, name)
+        
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(capacity, now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        
+        return None if bucket.take(rate, capacity, now) else bucket
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        throttling_config = get_config().get('throttling')
+        if user is None or not throttling_config:
+            return await handler(event, data)
+        
+        now = time.monotonic()
+        empty = self._take(user.id, 'default', throttling_config.get('default', {}), now)
+        
+        command = _command_key(event)
+        command_limit = throttling_config.get('commands', {}).get(command) if command else None
+        if empty is None and command_limit:
+            empty = self._take(user.id, command, command_limit, now)
+        
+        if empty is None:
+            return await handler(event, data)
+        
+        self.rejected += 1
+        logger.debug(f"Throttled {command or 'update'} from user {user.id}")
+        
+        if isinstance(event, CallbackQuery):
+            await event.answer(SLOW_DOWN_TEXT)
+        elif isinstance(event, Message) and not empty.warned:
+            # Warn once per throttled period, further messages are dropped silently
+            empty.warned = True
+            await event.answer(SLOW_DOWN_TEXT)
+        return None
@@ -0,0 +1,51 @@
+"""Unit of work per update"""
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+from bot.data.database import UnitOfWork, current_db_path, current_unit, current_unit_of_work
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """Handle every update with one database connection.
+
+    Repositories called by the handler share the connection of the unit. Its
+    writes are committed before every Bot API request (CommitBeforeRequest),
+    before a repository opens its own explicit transaction, and when the
+    handler returns. If the handler raises, only the writes since the last of
+    these commits are rolled back. Registered as an outer update middleware
+    after tenant selection, so the unit is opened on the tenant's database.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        unit = UnitOfWork(current_db_path())
+        token = current_unit.set(unit)
+        try:
+            result = await handler(event, data)
+            unit.commit()
+            return result
+        except Exception:
+            unit.rollback()
+            raise
+        finally:
+            unit.close()
+            current_unit.reset(token)
+
+
+class CommitBeforeRequest(BaseRequestMiddleware):
+    """Commit the unit of work of the calling handler before a Bot API request.
+
+    The write lock is released before the handler waits on the network, other
+    updates and scheduler jobs are not blocked by it.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        unit = current_unit_of_work()
+        if unit is not None:
+            unit.commit()
+        return await make_request(bot, method)
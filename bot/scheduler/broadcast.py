@@ -0,0 +1,381 @@
+"""Broadcast delivery shared by notification jobs"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError,
+    TelegramNotFound, TelegramRetryAfter, TelegramServerError
+)
+from aiogram.types import InlineKeyboardMarkup
+
+from bot.data.database import DeadLetter, User, user_repo, dead_letter_repo, response_repo
+from bot.middlewares.load import load_monitor
+from bot.middlewares.outbound import SendPriority, current_priority
+from config import current_tenant, get_config
+
+logger = logging.getLogger(__name__)
+
+# Bad Request descriptions that mean the chat will never accept messages again
+UNREACHABLE_DESCRIPTIONS = (
+    "chat not found",
+    "user not found",
+    "user is deactivated",
+    "peer_id_invalid",
+)
+
+
+def is_unreachable(error: Exception) -> bool:
+    """Check if send error means the user can never be reached (blocked bot, deleted account)"""
+    if isinstance(error, (TelegramForbiddenError, TelegramNotFound)):
+        return True
+    if isinstance(error, TelegramBadRequest):
+        description = error.message.lower()
+        return any(text in description for text in UNREACHABLE_DESCRIPTIONS)
+    return False
+
+
+def is_transient(error: Exception) -> bool:
+    """Check if send error may go away on retry (network, 5xx, flood control)"""
+    return isinstance(error, (TelegramNetworkError, TelegramServerError, TelegramRetryAfter))
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    @classmethod
+    def from_config(cls) -> 'RetryPolicy':
+        retry_config = get_config().get('broadcast', {}).get('retry', {})
+        return cls(
+            max_attempts=retry_config.get('max_attempts', 4),
+            base_delay=retry_config.get('base_delay', 1.0),
+            max_delay=retry_config.get('max_delay', 60.0)
+        )
+    
+    def delay(self, attempt: int, error: Exception) -> float:
+        """Delay before the given attempt (2 = first retry)"""
+        if isinstance(error, TelegramRetryAfter):
+            # Telegram says exactly how long to wait
+            return error.retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 2)))
+
+
+class RetryQueue:
+    """Delayed queue of retries, processed by its own task so the main send loop never waits"""
+    def __init__(self, send):
+        self._send = send
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+    
+    def __len__(self):
+        return len(self._heap)
+    
+    def schedule(self, user: User, attempt: int, delay: float):
+        """Send to user again after delay seconds"""
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), user, attempt))
+        self._idle.clear()
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                # Sleep until the earliest retry is due or an earlier one is scheduled
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            _, _, user, attempt = heapq.heappop(self._heap)
+            await self._send(user, attempt)
+    
+    async def join(self):
+        """Wait until all retries are done"""
+        await self._idle.wait()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class WavePacer:
+    """Size of broadcast waves from live load signals (additive increase, multiplicative decrease).
+    
+    After every wave the pacer looks at updates still being handled, smoothed
+    handler latency and smoothed time of response batch writes, which grows
+    when writers queue for the database write lock. If any is over
+    its limit the next wave is halved and sending pauses until the bot catches up,
+    otherwise the wave grows by `step`.
+    """
+    def __init__(self, min_wave: int = 10, max_wave: int = 200, step: int = 10,
+                 max_in_flight: int = 50, max_latency: float = 0.5,
+                 max_write_latency: float = 0.2, pause: float = 1.0):
+        self.min_wave = min_wave
+        self.max_wave = max_wave
+        self.step = step
+        self.max_in_flight = max_in_flight
+        self.max_latency = max_latency
+        self.max_write_latency = max_write_latency
+        self.pause = pause
+        self.wave_size = min_wave
+        self.pauses = 0
+    
+    @classmethod
+    def from_config(cls) -> Optional['WavePacer']:
+        """Pacer from `broadcast.pacing` config, None if pacing is off"""
+        pacing_config = get_config().get('broadcast', {}).get('pacing')
+        if not pacing_config or not pacing_config.get('enabled', True):
+            return None
+        return cls(
+            min_wave=pacing_config.get('min_wave', 10),
+            max_wave=pacing_config.get('max_wave', 200),
+            step=pacing_config.get('step', 10),
+            max_in_flight=pacing_config.get('max_in_flight', 50),
+            max_latency=pacing_config.get('max_latency_ms', 500) / 1000,
+            max_write_latency=pacing_config.get('max_write_latency_ms', 200) / 1000,
+            pause=pacing_config.get('pause', 1.0)
+        )
+    
+    def overloaded(self) -> bool:
+        return (load_monitor.in_flight > self.max_in_flight
+                or load_monitor.latency() > self.max_latency
+                or response_repo.write_latency() > self.max_write_latency)
+    
+    async def next_wave(self) -> int:
+        """Adjust wave size to current load and wait while the bot is overloaded"""
+        if not self.overloaded():
+            self.wave_size = min(self.max_wave, self.wave_size + self.step)
+            return self.wave_size
+        
+        self.wave_size = max(self.min_wave, self.wave_size // 2)
+        while self.overloaded():
+            self.pauses += 1
+            await asyncio.sleep(self.pause)
+        return self.wave_size
+
+
+class BroadcastResult:
+    """Progress and outcome of a single broadcast run"""
+    def __init__(self, name: str, total: int = 0):
+        self.name = name
+        self.total = total
+        self.success_count = 0
+        self.error_count = 0
+        self.unreachable: List[int] = []
+        self.dead_letters: List[DeadLetter] = []
+        self.retry_count = 0
+        self.retrying = 0
+        self.wave_size = 0
+        self.pauses = 0
+        self.deactivated_count = 0
+        # Recipients left out by targeting (already registered for the meeting)
+        self.skipped = 0
+        self.error_types = Counter()
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+    
+    @property
+    def is_running(self) -> bool:
+        return self.finished_at is None
+    
+    @property
+    def processed(self) -> int:
+        return self.success_count + self.error_count
+    
+    @property
+    def remaining(self) -> int:
+        return max(self.total - self.processed, 0)
+    
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+    
+    @property
+    def rate(self) -> float:
+        """Processed recipients per second"""
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed > 0 else 0.0
+    
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds until the run finishes at the current rate"""
+        if not self.is_running:
+            return 0.0
+        rate = self.rate
+        return self.remaining / rate if rate > 0 else None
+    
+    def __repr__(self):
+        return (f"<BroadcastResult(name={self.name}, success={self.success_count}, "
+                f"errors={self.error_count}, deactivated={self.deactivated_count})>")
+
+
+# Latest broadcast run per tenant, read by the admin progress view
+current_broadcasts: Dict[str, BroadcastResult] = {}
+
+
+def get_current_broadcast() -> Optional[BroadcastResult]:
+    """Latest broadcast run of the current tenant"""
+    return current_broadcasts.get(current_tenant.get().name)
+
+
+async def broadcast(bot: Bot, users: List[User], text: str, name: str,
+                    reply_markup: Optional[InlineKeyboardMarkup] = None,
+                    priority: SendPriority = SendPriority.INVITATION, skipped: int = 0) -> BroadcastResult:
+    """Send message to users.
+    
+    Sends are queued behind interactive replies with the given priority. With
+    `broadcast.pacing` enabled users are sent to in concurrent waves sized by
+    WavePacer, so inbound callbacks caused by the broadcast do not pile up.
+    Transient errors are retried with backoff on a separate delayed queue, users
+    that can no longer be reached are deactivated, and deliveries that still
+    fail are moved to the dead-letter table. `skipped` is the number of users
+    the caller left out by targeting, it is only reported.
+    """
+    result = BroadcastResult(name, total=len(users))
+    result.skipped = skipped
+    current_broadcasts[current_tenant.get().name] = result
+    policy = RetryPolicy.from_config()
+    pacer = WavePacer.from_config()
+    
+    # Per-recipient lines are sampled, errors beyond log_errors only go to the summary
+    log_config = get_config().get('broadcast', {})
+    log_every = max(int(log_config.get('log_every', 100)), 1)
+    log_errors = int(log_config.get('log_errors', 20))
+    
+    logger.info(f"{name} broadcast started", extra={'broadcast': name, 'total': result.total, 'skipped': skipped})
+    
+    def handle_failure(user: User, attempt: int, error: Exception):
+        if is_transient(error) and attempt < policy.max_attempts:
+            result.retry_count += 1
+            retries.schedule(user, attempt + 1, policy.delay(attempt + 1, error))
+            result.retrying = len(retries)
+            return
+        
+        result.error_count += 1
+        result.error_types[type(error).__name__] += 1
+        if is_unreachable(error):
+            result.unreachable.append(user.tg_id)
+        else:
+            result.dead_letters.append(DeadLetter(
+                tg_id=user.tg_id, broadcast=name, text=text,
+                reply_markup=reply_markup.model_dump_json(exclude_none=True) if reply_markup else None,
+                error=str(error), attempts=attempt
+            ))
+        if result.error_count <= log_errors:
+            logger.error(f"Failed to send {name} to user {user.tg_id} (attempt {attempt}): {error}")
+    
+    async def send(user: User, attempt: int = 1):
+        try:
+            await bot.send_message(
+                chat_id=user.tg_id,
+                text=text,
+                reply_markup=reply_markup
+            )
+            result.success_count += 1
+        except Exception as e:
+            handle_failure(user, attempt, e)
+        result.retrying = len(retries)
+        
+        if attempt == 1 and result.processed % log_every == 0:
+            logger.info(f"{name} progress: {result.processed}/{result.total}", extra={
+                'broadcast': name, 'processed': result.processed, 'total': result.total,
+                'success': result.success_count, 'errors': result.error_count,
+                'retrying': result.retrying,
+            })
+    
+    retries = RetryQueue(send)
+    # Retry task is created inside this context and inherits the priority
+    priority_token = current_priority.set(priority)
+    
+    try:
+        if pacer is None:
+            for user in users:
+                await send(user)
+        else:
+            position = 0
+            result.wave_size = pacer.wave_size
+            while position < len(users):
+                wave = users[position:position + result.wave_size]
+                await asyncio.gather(*(send(user) for user in wave))
+                position += len(wave)
+                result.wave_size = await pacer.next_wave()
+                result.pauses = pacer.pauses
+        
+        # Main pass is done, wait for the delayed retries
+        await retries.join()
+        
+        if result.unreachable:
+            # One UPDATE for the whole broadcast instead of a write per failed user
+            result.deactivated_count = user_repo.deactivate_users(result.unreachable)
+            logger.info(
+                f"{name}: deactivated {result.deactivated_count} unreachable users, "
+                f"saving {result.deactivated_count} sends in every future broadcast"
+            )
+        
+        if result.dead_letters:
+            dead_letter_repo.add_many(result.dead_letters)
+            logger.warning(f"{name}: {len(result.dead_letters)} deliveries moved to dead letters")
+    finally:
+        current_priority.reset(priority_token)
+        result.finished_at = time.monotonic()
+    
+    logger.info(
+        f"{name} broadcast completed. Success: {result.success_count}, Errors: {result.error_count}",
+        extra={
+            'broadcast': name,
+            'total': result.total,
+            'skipped': result.skipped,
+            'success': result.success_count,
+            'errors': result.error_count,
+            'error_types': dict(result.error_types),
+            'retries': result.retry_count,
+            'pauses': result.pauses,
+            'dead_letters': len(result.dead_letters),
+            'deactivated': result.deactivated_count,
+            'elapsed_sec': round(result.elapsed, 3),
+            'rate_per_sec': round(result.rate, 2),
+        }
+    )
+    return result
+
+
+async def replay_dead_letters(bot: Bot) -> int:
+    """Send all dead letters again, grouped by original message; return number replayed"""
+    letters = dead_letter_repo.get_all()
+    if not letters:
+        return 0
+    
+    groups = {}
+    for letter in letters:
+        groups.setdefault((letter.broadcast, letter.text, letter.reply_markup), []).append(letter)
+    
+    for (name, text, reply_markup), group in groups.items():
+        markup = InlineKeyboardMarkup.model_validate_json(reply_markup) if reply_markup else None
+        await broadcast(bot, [User(tg_id=letter.tg_id) for letter in group], text,
+                        f"{name} (replay)", reply_markup=markup)
+        # Failures of the replay are new dead letters; a group that was not sent keeps its rows
+        dead_letter_repo.delete([letter.id for letter in group])
+    
+    return len(letters)
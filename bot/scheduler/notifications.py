@@ -1,177 +1,448 @@
 """Notification scheduler for meeting invitations and reminders"""
+import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import pytz
 
-from bot.data.database import user_repo
-from config import config, BOT_TOKEN
+from bot.data.audience import check_audience_index
+from bot.data.database import user_repo, registration_repo, response_repo, incremental_vacuum, current_db_path
+from bot.data.meetings import Meeting, MeetingsCatalog, get_meetings_catalog
+from bot.data.snapshot import backup_database
+from bot.middlewares.outbound import SendPriority
+from bot.scheduler.broadcast import broadcast
+from config import current_tenant, get_config
 
 logger = logging.getLogger(__name__)
 
-# Get timezone from config
-TIMEZONE = pytz.timezone(config['timezone'])
+# Global scheduler shared by all tenants; job ids are prefixed with the tenant name
+scheduler = AsyncIOScheduler(timezone=pytz.timezone(get_config()['timezone']))
 
-# Global scheduler
-scheduler = AsyncIOScheduler(timezone=TIMEZONE)
+# How often buffered meeting responses are written to the database (seconds)
+RESPONSE_FLUSH_INTERVAL = 2
 
+# Invitation job of users in the bot time zone; other zones get "send_invitation:<zone>"
+INVITATION_JOB = 'send_invitation'
 
-async def send_invitation(bot: Bot):
-    """Send meeting invitation on Monday at 10:00 MSK"""
-    logger.info("Starting invitation broadcast...")
+# How often invitation jobs are matched to the time zones users have chosen (seconds)
+TIMEZONE_SYNC_INTERVAL = 300
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# "On <weekday>" for invitation texts
+ON_WEEKDAY = ['В понедельник', 'Во вторник', 'В среду', 'В четверг', 'В пятницу', 'В субботу', 'В воскресенье']
+
+
+def get_timezone():
+    """Bot time zone of the current tenant (jobs pick up a change after restart)"""
+    return pytz.timezone(get_config()['timezone'])
+
+
+def _job_id(job_id: str) -> str:
+    """Scheduler job id of the current tenant"""
+    return f"{current_tenant.get().name}/{job_id}"
+
+
+async def _run_for_tenant(tenant, func, *args):
+    """Run job with the tenant's config and database"""
+    token = current_tenant.set(tenant)
+    try:
+        if asyncio.iscoroutinefunction(func):
+            await func(*args)
+        else:
+            # Blocking jobs run in a thread, which gets a copy of the tenant context
+            await asyncio.to_thread(func, *args)
+    finally:
+        current_tenant.reset(token)
+
+
+def _add_tenant_job(func, trigger, job_id: str, name: str, args=()):
+    """Schedule job of the current tenant"""
+    tenant = current_tenant.get()
+    scheduler.add_job(
+        _run_for_tenant,
+        trigger,
+        args=[tenant, func, *args],
+        id=_job_id(job_id),
+        name=f"{name} [{tenant.name}]",
+        replace_existing=True
+    )
+
+
+def get_target_meeting() -> Meeting:
+    """Meeting that invitations, answers and reminders refer to.
     
-    users = user_repo.get_all_registered_users()
-    meeting_topic = config['meeting']['topic']
+    With `schedule.invitation_meeting: next` (default) it is the nearest meeting
+    of upcoming_meetings from today on, so it stays the same from the invitation
+    until the meeting day and matches the dates users register for. With
+    `weekly`, or when no meeting is listed, it is the next `reminder_1_day` from
+    today with topic, time and link of the `meeting` section (or of the
+    upcoming_meetings entry on that date).
+    """
+    catalog = get_meetings_catalog()
+    today = datetime.now(get_timezone()).date()
+    if get_config()['schedule'].get('invitation_meeting', 'next') == 'next':
+        upcoming = catalog.upcoming(today)
+        if upcoming:
+            return upcoming[0]
     
+    meeting_day = WEEKDAYS.index(get_config()['schedule']['reminder_1_day'].lower())
+    meeting_date = (today + timedelta(days=(meeting_day - today.weekday()) % 7)).isoformat()
+    meeting = catalog.get(meeting_date)
+    if meeting:
+        return meeting
+    default = get_config()['meeting']
+    return Meeting(meeting_date, default['topic'], default.get('time', '11:00'), default.get('link'))
+
+
+def get_current_meeting_date() -> str:
+    """Date of the target meeting, the key answers are recorded under"""
+    return get_target_meeting().date
+
+
+def _reminder_audience(meeting: Meeting):
+    """Users who confirmed the meeting or registered for it (registered users are not invited)"""
+    users = response_repo.get_users_by_response(meeting.date, "yes")
+    confirmed = {user.tg_id for user in users}
+    return users + [user for user in registration_repo.get_registered_users(meeting.date)
+                    if user.tg_id not in confirmed]
+
+
+def _day_phrase(meeting: Meeting) -> str:
+    """"Сегодня", "Завтра" or "В <weekday>" for the meeting day"""
+    days_left = (meeting.day - datetime.now(get_timezone()).date()).days
+    if days_left == 0:
+        return "Сегодня"
+    if days_left == 1:
+        return "Завтра"
+    return ON_WEEKDAY[meeting.day.weekday()]
+
+
+async def send_invitation(bot: Bot, timezone: str = None):
+    """Send meeting invitation on Monday at 10:00 local time of one time zone bucket.
+    
+    Without timezone it is the bot time zone bucket, which also has users
+    who have not chosen a time zone. Users already registered for the
+    meeting are not invited.
+    """
+    bot_timezone = get_timezone().zone
+    timezone = timezone or bot_timezone
+    include_unset = timezone == bot_timezone
+    meeting = get_target_meeting()
+    meeting_date = meeting.date
+    logger.info(f"Starting invitation broadcast for {timezone}, meeting {meeting_date}...")
+    
+    users = user_repo.get_registered_users_in_timezone(timezone, include_unset, exclude_meeting=meeting_date)
+    skipped = user_repo.count_registered_for_meeting(meeting_date, timezone, include_unset)
+    if skipped:
+        logger.info(f"Invitation for {meeting_date} ({timezone}): {skipped} users already registered, not sent",
+                    extra={'metric': 'invitations_skipped', 'meeting_date': meeting_date, 'skipped': skipped})
+    
+    # Answers are recorded per meeting, so the date goes into the callback data
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="Да, буду", callback_data="meeting_yes"),
-            InlineKeyboardButton(text="Нет, не смогу", callback_data="meeting_no")
+            InlineKeyboardButton(text="Да, буду", callback_data=f"meeting_yes:{meeting_date}"),
+            InlineKeyboardButton(text="Нет, не смогу", callback_data=f"meeting_no:{meeting_date}")
         ]
     ])
     
     message_text = (
-        f"В среду будет встреча на тему: «{meeting_topic}».\n"
+        f"{ON_WEEKDAY[meeting.day.weekday()]} будет встреча на тему: «{meeting.topic}».\n"
         f"Придёшь? 🙂"
     )
     
-    success_count = 0
-    error_count = 0
-    
-    for user in users:
-        try:
-            await bot.send_message(
-                chat_id=user.tg_id,
-                text=message_text,
-                reply_markup=keyboard
-            )
-            success_count += 1
-            logger.info(f"Invitation sent to user {user.tg_id}")
-        except Exception as e:
-            error_count += 1
-            logger.error(f"Failed to send invitation to user {user.tg_id}: {e}")
-    
-    logger.info(f"Invitation broadcast completed. Success: {success_count}, Errors: {error_count}")
+    await broadcast(bot, users, message_text, f"Invitation ({timezone})", reply_markup=keyboard, skipped=skipped)
 
 
 async def send_first_reminder(bot: Bot):
-    """Send first reminder on Wednesday at 09:00 MSK to those who confirmed"""
-    logger.info("Starting first reminder broadcast...")
+    """Send first reminder on Wednesday at 09:00 MSK to those who confirmed the target meeting"""
+    meeting = get_target_meeting()
+    logger.info(f"Starting first reminder broadcast, meeting {meeting.date}...")
     
-    users = user_repo.get_users_by_response("yes")
-    meeting_topic = config['meeting']['topic']
-    meeting_time = config['meeting']['time']
-    meeting_link = config['meeting']['link']
+    users = _reminder_audience(meeting)
+    meeting_link = meeting.link or get_config()['meeting']['link']
     
     message_text = (
-        f"Доброе утро! Сегодня встреча: «{meeting_topic}».\n"
-        f"Начало в {meeting_time}. Ссылка: {meeting_link}"
+        f"Доброе утро! {_day_phrase(meeting)} встреча: «{meeting.topic}».\n"
+        f"Начало в {meeting.time}. Ссылка: {meeting_link}"
     )
     
-    success_count = 0
-    error_count = 0
-    
-    for user in users:
-        try:
-            await bot.send_message(
-                chat_id=user.tg_id,
-                text=message_text
-            )
-            success_count += 1
-            logger.info(f"First reminder sent to user {user.tg_id}")
-        except Exception as e:
-            error_count += 1
-            logger.error(f"Failed to send first reminder to user {user.tg_id}: {e}")
-    
-    logger.info(f"First reminder broadcast completed. Success: {success_count}, Errors: {error_count}")
+    await broadcast(bot, users, message_text, "First reminder", priority=SendPriority.REMINDER)
 
 
 async def send_second_reminder(bot: Bot):
-    """Send second reminder on Wednesday at 10:40 MSK to those who confirmed"""
-    logger.info("Starting second reminder broadcast...")
+    """Send second reminder on Wednesday at 10:40 MSK to those who confirmed the target meeting"""
+    meeting = get_target_meeting()
+    if meeting.day != datetime.now(get_timezone()).date():
+        # "In 20 minutes" only makes sense on the meeting day
+        logger.warning(f"Second reminder skipped: meeting {meeting.date} is not today, "
+                       f"check schedule.reminder_2_day")
+        return
+    logger.info(f"Starting second reminder broadcast, meeting {meeting.date}...")
     
-    users = user_repo.get_users_by_response("yes")
-    meeting_link = config['meeting']['link']
+    users = _reminder_audience(meeting)
+    meeting_link = meeting.link or get_config()['meeting']['link']
     
     message_text = (
         f"Через 20 минут встречаемся! Вот ссылка: {meeting_link}"
     )
     
-    success_count = 0
-    error_count = 0
+    await broadcast(bot, users, message_text, "Second reminder", priority=SendPriority.REMINDER)
+
+
+# Job id -> (day key, time key) in the `schedule` config section
+SCHEDULED_JOBS = {
+    INVITATION_JOB: ('invitation_day', 'invitation_time'),
+    'send_first_reminder': ('reminder_1_day', 'reminder_1_time'),
+    'send_second_reminder': ('reminder_2_day', 'reminder_2_time'),
+}
+
+
+def _build_trigger(schedule_config, job_id: str, timezone=None) -> CronTrigger:
+    """Build cron trigger for a scheduled job from the `schedule` config section"""
+    day_key, time_key = SCHEDULED_JOBS[job_id]
+    hour, minute = map(int, schedule_config[time_key].split(':'))
+    return CronTrigger(day_of_week=_day_to_cron(schedule_config[day_key]), hour=hour, minute=minute,
+                       timezone=timezone or get_timezone())
+
+
+def _timezone_invitation_jobs() -> dict:
+    """Get per time zone invitation jobs: zone name -> job"""
+    prefix = f"{_job_id(INVITATION_JOB)}:"
+    return {job.id[len(prefix):]: job for job in scheduler.get_jobs() if job.id.startswith(prefix)}
+
+
+def sync_invitation_jobs(bot: Bot):
+    """Add invitation jobs for new user time zones and drop the ones nobody uses"""
+    wanted = set(user_repo.get_audience_timezones()) - {get_timezone().zone}
+    existing = _timezone_invitation_jobs()
+    
+    for timezone, job in existing.items():
+        if timezone not in wanted:
+            job.remove()
+            logger.info(f"Removed invitation job for {timezone}")
     
-    for user in users:
+    schedule_config = get_config()['schedule']
+    for timezone in wanted - existing.keys():
+        _add_tenant_job(
+            send_invitation,
+            _build_trigger(schedule_config, INVITATION_JOB, pytz.timezone(timezone)),
+            f"{INVITATION_JOB}:{timezone}",
+            f"Send meeting invitation ({timezone})",
+            args=[bot, timezone]
+        )
+        logger.info(f"Scheduled invitation for {timezone}: {schedule_config['invitation_day']} at {schedule_config['invitation_time']}")
+
+
+def _schedule_changed(old_schedule, new_schedule, job_id: str) -> bool:
+    """Check if day or time of a scheduled job differs between two configs"""
+    return any(old_schedule.get(key) != new_schedule.get(key) for key in SCHEDULED_JOBS[job_id])
+
+
+def validate_jobs(new_config):
+    """Build the meetings catalog and job triggers of a reloaded config, raising if it cannot be used"""
+    MeetingsCatalog(new_config.get('upcoming_meetings', ()))
+    timezone = pytz.timezone(new_config['timezone'])
+    for job_id in SCHEDULED_JOBS:
+        _build_trigger(new_config['schedule'], job_id, timezone)
+    IntervalTrigger(seconds=new_config.get('config_reload_interval', 5))
+
+
+def reconcile_jobs(old_config, new_config):
+    """Reschedule only the jobs whose triggers changed after config reload"""
+    old_schedule = old_config['schedule']
+    new_schedule = new_config['schedule']
+    
+    for job_id, (day_key, time_key) in SCHEDULED_JOBS.items():
+        if not _schedule_changed(old_schedule, new_schedule, job_id):
+            continue
+        
         try:
-            await bot.send_message(
-                chat_id=user.tg_id,
-                text=message_text
-            )
-            success_count += 1
-            logger.info(f"Second reminder sent to user {user.tg_id}")
-        except Exception as e:
-            error_count += 1
-            logger.error(f"Failed to send second reminder to user {user.tg_id}: {e}")
+            trigger = _build_trigger(new_schedule, job_id)
+        except (KeyError, ValueError) as e:
+            logger.error(f"Invalid schedule for {job_id}, keeping previous trigger: {e}")
+            continue
+        
+        scheduler.reschedule_job(_job_id(job_id), trigger=trigger)
+        logger.info(f"Rescheduled {_job_id(job_id)}: {new_schedule[day_key]} at {new_schedule[time_key]} {get_timezone()}")
+        
+        if job_id == INVITATION_JOB:
+            # Same local day and time in every time zone bucket
+            for timezone, job in _timezone_invitation_jobs().items():
+                job.reschedule(_build_trigger(new_schedule, job_id, pytz.timezone(timezone)))
+    
+    for job_id, (section, _, _, _) in DAILY_JOBS.items():
+        if old_config.get(section) != new_config.get(section):
+            try:
+                sync_daily_job(job_id, new_config.get(section))
+            except (AttributeError, ValueError) as e:
+                logger.error(f"Invalid {section} time, keeping previous trigger: {e}")
     
-    logger.info(f"Second reminder broadcast completed. Success: {success_count}, Errors: {error_count}")
+    reload_interval = new_config.get('config_reload_interval', 5)
+    if old_config.get('config_reload_interval', 5) != reload_interval:
+        scheduler.reschedule_job(_job_id('reload_config'), trigger=IntervalTrigger(seconds=reload_interval))
+        logger.info(f"Config reload check every {reload_interval}s")
+
+
+async def reload_config():
+    """Pick up config.yaml changes of the current tenant"""
+    await current_tenant.get().config_manager.check_for_changes()
+
+
+async def flush_responses():
+    """Write buffered meeting responses (on the event loop, next to record())"""
+    response_repo.flush()
+
+
+async def run_backup():
+    """Create daily online database backup"""
+    keep = get_config().get('backup', {}).get('keep', 7)
+    try:
+        await asyncio.to_thread(backup_database, keep)
+    except Exception as e:
+        logger.error(f"Database backup failed: {e}")
+
+
+def _apply_retention(keep_days: int, batch_size: int, vacuum_pages: int):
+    """Archive old registrations and release freed pages"""
+    before_date = (datetime.now(get_timezone()).date() - timedelta(days=keep_days)).isoformat()
+    archived = registration_repo.archive_past_registrations(before_date, batch_size)
+    freed = incremental_vacuum(vacuum_pages)
+    logger.info(f"Retention: archived {archived} registrations before {before_date}, freed {freed} pages",
+                extra={'archived': archived, 'freed_pages': freed})
+
+
+async def run_retention():
+    """Move registrations of past meetings to the archive"""
+    retention_config = get_config().get('retention', {})
+    try:
+        await asyncio.to_thread(
+            _apply_retention,
+            retention_config.get('keep_days', 30),
+            retention_config.get('batch_size', 500),
+            retention_config.get('vacuum_pages', 1000)
+        )
+    except Exception as e:
+        logger.error(f"Retention job failed: {e}")
+
+
+# Daily jobs: job id -> (config section, job, name, default time)
+DAILY_JOBS = {
+    'backup_database': ('backup', run_backup, 'Backup database', '03:00'),
+    'retention': ('retention', run_retention, 'Archive past registrations', '04:00'),
+}
+
+
+def sync_daily_job(job_id: str, section_config):
+    """Schedule daily job at the time from its config section, remove it if the section is gone"""
+    section, func, name, default_time = DAILY_JOBS[job_id]
+    if not section_config:
+        if scheduler.get_job(_job_id(job_id)):
+            scheduler.remove_job(_job_id(job_id))
+            logger.info(f"Removed {name.lower()} job")
+        return
+    
+    timezone = get_timezone()
+    hour, minute = map(int, section_config.get('time', default_time).split(':'))
+    _add_tenant_job(func, CronTrigger(hour=hour, minute=minute, timezone=timezone), job_id, name)
+    logger.info(f"Scheduled {name.lower()}: daily at {hour:02d}:{minute:02d} {timezone}")
+
+
+def check_audience():
+    """Compare audience index with the database"""
+    check_audience_index(current_db_path())
 
 
 def setup_scheduler(bot: Bot):
-    """Setup scheduler with all jobs"""
+    """Setup scheduler with all jobs of the current tenant and start it"""
+    timezone = get_timezone()
     
     # Parse schedule from config
-    schedule_config = config['schedule']
+    schedule_config = get_config()['schedule']
     
     # Monday 10:00 MSK - Send invitation
-    invitation_day = schedule_config['invitation_day']
-    invitation_time = schedule_config['invitation_time']
-    hour, minute = map(int, invitation_time.split(':'))
-    
-    scheduler.add_job(
+    _add_tenant_job(
         send_invitation,
-        CronTrigger(day_of_week=_day_to_cron(invitation_day), hour=hour, minute=minute, timezone=TIMEZONE),
-        args=[bot],
-        id='send_invitation',
-        name='Send meeting invitation',
-        replace_existing=True
+        _build_trigger(schedule_config, INVITATION_JOB),
+        INVITATION_JOB,
+        'Send meeting invitation',
+        args=[bot]
     )
-    logger.info(f"Scheduled invitation: {invitation_day} at {invitation_time} {TIMEZONE}")
+    logger.info(f"Scheduled invitation: {schedule_config['invitation_day']} at {schedule_config['invitation_time']} {timezone}")
     
-    # Wednesday 09:00 MSK - First reminder
-    reminder1_day = schedule_config['reminder_1_day']
-    reminder1_time = schedule_config['reminder_1_time']
-    hour, minute = map(int, reminder1_time.split(':'))
+    # Monday 10:00 local time for users who have chosen another time zone
+    sync_invitation_jobs(bot)
+    _add_tenant_job(
+        sync_invitation_jobs,
+        IntervalTrigger(seconds=TIMEZONE_SYNC_INTERVAL),
+        'sync_invitation_jobs',
+        'Sync time zone invitation jobs',
+        args=[bot]
+    )
     
-    scheduler.add_job(
+    # Wednesday 09:00 MSK - First reminder
+    _add_tenant_job(
         send_first_reminder,
-        CronTrigger(day_of_week=_day_to_cron(reminder1_day), hour=hour, minute=minute, timezone=TIMEZONE),
-        args=[bot],
-        id='send_first_reminder',
-        name='Send first reminder',
-        replace_existing=True
+        _build_trigger(schedule_config, 'send_first_reminder'),
+        'send_first_reminder',
+        'Send first reminder',
+        args=[bot]
     )
-    logger.info(f"Scheduled first reminder: {reminder1_day} at {reminder1_time} {TIMEZONE}")
+    logger.info(f"Scheduled first reminder: {schedule_config['reminder_1_day']} at {schedule_config['reminder_1_time']} {timezone}")
     
     # Wednesday 10:40 MSK - Second reminder
-    reminder2_day = schedule_config['reminder_2_day']
-    reminder2_time = schedule_config['reminder_2_time']
-    hour, minute = map(int, reminder2_time.split(':'))
+    _add_tenant_job(
+        send_second_reminder,
+        _build_trigger(schedule_config, 'send_second_reminder'),
+        'send_second_reminder',
+        'Send second reminder',
+        args=[bot]
+    )
+    logger.info(f"Scheduled second reminder: {schedule_config['reminder_2_day']} at {schedule_config['reminder_2_time']} {timezone}")
+    
+    # Watch config.yaml and apply changes without restart
+    current_tenant.get().config_manager.add_validator(validate_jobs)
+    current_tenant.get().config_manager.add_listener(reconcile_jobs)
+    reload_interval = get_config().get('config_reload_interval', 5)
+    _add_tenant_job(
+        reload_config,
+        IntervalTrigger(seconds=reload_interval),
+        'reload_config',
+        'Reload config'
+    )
+    logger.info(f"Config reload check every {reload_interval}s")
     
+    # Batched writes of meeting responses (one job flushes the buffers of all tenants)
     scheduler.add_job(
-        send_second_reminder,
-        CronTrigger(day_of_week=_day_to_cron(reminder2_day), hour=hour, minute=minute, timezone=TIMEZONE),
-        args=[bot],
-        id='send_second_reminder',
-        name='Send second reminder',
+        flush_responses,
+        IntervalTrigger(seconds=RESPONSE_FLUSH_INTERVAL),
+        id='flush_responses',
+        name='Flush meeting responses',
         replace_existing=True
     )
-    logger.info(f"Scheduled second reminder: {reminder2_day} at {reminder2_time} {TIMEZONE}")
     
-    # Start scheduler
-    scheduler.start()
-    logger.info("Scheduler started successfully")
+    # Daily online backup and archival of past meetings
+    for job_id, (section, _, _, _) in DAILY_JOBS.items():
+        sync_daily_job(job_id, get_config().get(section))
+    
+    # Audience index consistency check
+    audience_config = get_config().get('audience_index', {})
+    if audience_config.get('enabled', False):
+        _add_tenant_job(
+            check_audience,
+            IntervalTrigger(seconds=audience_config.get('check_interval', 3600)),
+            'check_audience_index',
+            'Check audience index'
+        )
+    
+    # Start scheduler (once, it is shared by all tenants)
+    if not scheduler.running:
+        scheduler.start()
+        logger.info("Scheduler started successfully")
 
 
 def _day_to_cron(day: str) -> str:
@@ -193,4 +464,7 @@ def stop_scheduler():
     if scheduler.running:
         scheduler.shutdown()
         logger.info("Scheduler stopped")
+    
+    # Do not lose responses that are still buffered
+    response_repo.flush()
 
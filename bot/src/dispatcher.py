@@ -0,0 +1,70 @@
+"""Dispatcher and session wiring shared by the bot and the replay tool"""
+from typing import Tuple
+from aiogram import Dispatcher
+from aiogram.client.session.base import BaseSession
+from config import get_config
+
+# Import handlers
+from bot.handlers import start, menu, meetings, admin, about
+
+# Import middlewares
+from bot.middlewares.debounce import CallbackDebounceMiddleware
+from bot.middlewares.load import load_monitor
+from bot.middlewares.throttling import ThrottlingMiddleware
+from bot.middlewares.outbound import OutboundScheduler
+from bot.middlewares.tenant import TenantMiddleware
+from bot.middlewares.unit_of_work import CommitBeforeRequest, UnitOfWorkMiddleware
+
+
+def setup_session(session: BaseSession) -> BaseSession:
+    """Add request middlewares to the session shared by all bots"""
+    # Handlers commit their unit of work before each API call instead of holding it across the request
+    if get_config().get('unit_of_work', {}).get('enabled', True):
+        session.middleware(CommitBeforeRequest())
+
+    # API calls of each bot share one rate budget, interactive replies go before broadcasts
+    outbound_config = get_config().get('outbound', {})
+    session.middleware(OutboundScheduler(
+        rate=outbound_config.get('rate', 25),
+        burst=outbound_config.get('burst', 25),
+        reserve=outbound_config.get('reserve', 5)
+    ))
+    return session
+
+
+def create_dispatcher() -> Tuple[Dispatcher, TenantMiddleware]:
+    """Create dispatcher with middlewares and routers; bots are registered on the returned TenantMiddleware"""
+    # Routers are shared, updates run with their bot's config and database
+    dp = Dispatcher()
+    tenant_middleware = TenantMiddleware()
+    dp.update.outer_middleware(tenant_middleware)
+
+    # Inbound backlog and handler latency, used to pace broadcasts
+    dp.update.outer_middleware(load_monitor)
+
+    # One database connection per update, committed before API calls and when the handler returns
+    if get_config().get('unit_of_work', {}).get('enabled', True):
+        dp.update.outer_middleware(UnitOfWorkMiddleware())
+
+    # Collapse double-taps on inline buttons before they reach handlers
+    debounce_config = get_config().get('debounce', {})
+    dp.callback_query.outer_middleware(CallbackDebounceMiddleware(
+        window=debounce_config.get('window_seconds', 2.0),
+        max_entries=debounce_config.get('max_entries', 10000)
+    ))
+
+    # Per-user rate limits for all handlers (limits are read from config on each update)
+    throttling = ThrottlingMiddleware(
+        max_buckets=get_config().get('throttling', {}).get('max_buckets', 10000)
+    )
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
+
+    # Register routers (order matters - more specific first)
+    dp.include_router(admin.router)
+    dp.include_router(about.router)
+    dp.include_router(menu.router)
+    dp.include_router(meetings.router)
+    dp.include_router(start.router)
+
+    return dp, tenant_middleware
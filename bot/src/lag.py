@@ -0,0 +1,108 @@
+"""Event loop lag monitor.
+
+A coroutine sleeps for a fixed tick and measures how late it wakes up; the
+difference is time the loop spent running something else without yielding.
+A watchdog thread notices when the ticks stop and logs the stack of the loop
+thread, pointing at the blocking call while it is still running.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Measure event loop scheduling delay and catch blocking code"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.2, report_interval: float = 60.0):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._lag_sum = 0.0
+        self._ticks = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start monitoring the running event loop"""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-lag-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(f"Loop lag monitor started: tick {self.interval * 1000:.0f} ms, "
+                    f"threshold {self.threshold * 1000:.0f} ms")
+
+    def stop(self):
+        """Stop monitoring"""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        reported_at = time.monotonic()
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+
+            lag = max(now - expected, 0.0)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self._lag_sum += lag
+            self._ticks += 1
+            if lag > self.threshold:
+                self.stalls += 1
+
+            if now - reported_at >= self.report_interval:
+                self._report()
+                reported_at = now
+
+    def _report(self):
+        """Log lag metrics for the last period and start a new one"""
+        logger.info(f"Event loop lag: max {self.max_lag * 1000:.1f} ms", extra={
+            'metric': 'loop_lag',
+            'lag_avg_ms': round(self._lag_sum / self._ticks * 1000, 2) if self._ticks else 0.0,
+            'lag_max_ms': round(self.max_lag * 1000, 2),
+            'stalls': self.stalls,
+            'ticks': self._ticks,
+        })
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._lag_sum = 0.0
+        self._ticks = 0
+
+    def _watch(self):
+        """Watchdog thread: dump loop thread stack when ticks stop for longer than threshold"""
+        reported_heartbeat = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for <= self.threshold or heartbeat == reported_heartbeat:
+                continue
+
+            # One stack per stall
+            reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            logger.warning(f"Event loop blocked for {blocked_for * 1000:.0f} ms", extra={
+                'metric': 'loop_blocked',
+                'blocked_ms': round(blocked_for * 1000),
+                'stack': stack,
+            })
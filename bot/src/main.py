@@ -1,37 +1,73 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from config import BOT_TOKEN
+from pathlib import Path
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from config import get_config, load_tenants, use_tenant
+from bot.data.audience import load_audience_index
+from bot.data.database import current_db_path, init_db
 
-# Import handlers
-from bot.handlers import start, menu, meetings, admin, about
+from bot.src.dispatcher import create_dispatcher, setup_session
+from bot.src.log import setup_logging
+from bot.src.lag import LoopLagMonitor
+
+# Traffic recording
+from bot.handlers.menu import get_main_menu_keyboard
+from bot.middlewares.recorder import UpdateRecorder
 
 # Import scheduler
 from bot.scheduler.notifications import setup_scheduler, stop_scheduler
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Configure logging (records are written by a background thread)
+logging_config = get_config().get('logging', {})
+log_listener = setup_logging(
+    level=logging_config.get('level', 'INFO'),
+    json_output=logging_config.get('json', True),
+    queue_size=logging_config.get('queue_size', 10000)
 )
 logger = logging.getLogger(__name__)
 
 
 async def main():
     """Main bot entry point"""
-    # Initialize bot and dispatcher
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
+    # One HTTP connection pool for all bots of this process
+    session = AiohttpSession()
+    
+    setup_session(session)
+    dp, tenant_middleware = create_dispatcher()
     
-    # Register routers (order matters - more specific first)
-    dp.include_router(admin.router)
-    dp.include_router(about.router)
-    dp.include_router(menu.router)
-    dp.include_router(meetings.router)
-    dp.include_router(start.router)
+    # Opt-in recording of incoming traffic for replay benchmarks (python -m bot.src.replay)
+    recorder_config = get_config().get('recorder', {})
+    recorder = None
+    if recorder_config.get('enabled', False):
+        menu_texts = [button.text for row in get_main_menu_keyboard().keyboard for button in row]
+        recorder = UpdateRecorder(Path(recorder_config.get('path', 'recordings/updates.jsonl.gz')), keep_texts=menu_texts)
+        dp.update.outer_middleware(recorder)
     
-    # Setup scheduler
-    setup_scheduler(bot)
+    # Bots, databases and scheduler jobs of all tenants
+    bots = []
+    for tenant in load_tenants():
+        with use_tenant(tenant):
+            if tenant.db_path:
+                init_db(tenant.db_path)
+            if get_config().get('audience_index', {}).get('enabled', False):
+                load_audience_index(current_db_path())
+            bot = Bot(token=tenant.token, session=session)
+            tenant_middleware.register(bot.id, tenant)
+            setup_scheduler(bot)
+            bots.append(bot)
+            logger.info(f"Tenant {tenant.name} ready")
+    
+    # Report event loop lag and stacks of code that blocks the loop
+    lag_config = get_config().get('loop_monitor', {})
+    lag_monitor = None
+    if lag_config.get('enabled', False):
+        lag_monitor = LoopLagMonitor(
+            interval=lag_config.get('interval_ms', 100) / 1000,
+            threshold=lag_config.get('threshold_ms', 200) / 1000,
+            report_interval=lag_config.get('report_interval', 60)
+        )
+        lag_monitor.start()
     
     logger.info("Bot starting...")
     logger.info("Scheduler initialized with meeting notifications")
@@ -39,10 +75,14 @@ async def main():
     
     # Start polling
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await dp.start_polling(*bots, allowed_updates=dp.resolve_used_update_types())
     finally:
+        if lag_monitor is not None:
+            lag_monitor.stop()
+        if recorder is not None:
+            recorder.close()
         stop_scheduler()
-        await bot.session.close()
+        await session.close()
 
 
 if __name__ == "__main__":
@@ -51,4 +91,7 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
         stop_scheduler()
+    finally:
+        # Flush queued log records
+        log_listener.stop()
 
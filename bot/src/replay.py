@@ -0,0 +1,229 @@
+"""Replay of recorded update traffic for benchmarking.
+
+Feeds a recording made by UpdateRecorder through the bot's dispatcher, with
+the same middlewares and handlers, against stub bots whose API calls take a
+fixed simulated latency. Every bot of the recording gets a scratch database,
+empty or a snapshot of --database. Reports handler latency per update kind,
+so two versions of the bot can be compared on identical traffic:
+
+    python -m bot.src.replay recordings/updates.jsonl.gz --speed 1
+    python -m bot.src.replay recordings/updates.jsonl.gz --speed 10 --json
+    python -m bot.src.replay recordings/updates.jsonl.gz --speed max
+
+Ids in the recording are anonymized, so admin-only flows replay as
+"no access" replies.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message, Update
+from config import Tenant, config_manager, get_config, use_tenant
+from bot.data.audience import load_audience_index
+from bot.data.database import init_db
+from bot.data.snapshot import create_snapshot
+from bot.middlewares.recorder import open_recording
+from bot.src.dispatcher import create_dispatcher, setup_session
+
+logger = logging.getLogger(__name__)
+
+
+class StubSession(BaseSession):
+    """Session that answers every API call after a fixed delay without network"""
+
+    def __init__(self, latency: float = 0.05):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        if returning is Message or Message in getattr(returning, '__args__', ()):
+            # Parsed like a real response, so the message is bound to the bot
+            result = {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': getattr(method, 'chat_id', None) or 0, 'type': 'private'},
+                'text': getattr(method, 'text', None),
+            }
+            response = self.check_response(bot, method, 200, json.dumps({'ok': True, 'result': result}))
+            return response.result
+        if getattr(returning, '__origin__', None) is list:
+            return []
+        return returning.model_construct()
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        # Recorded files are redacted, downloads are empty
+        return
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def load_recording(path: Path, limit: int = 0) -> List[Dict[str, Any]]:
+    """Read recorded updates in arrival order"""
+    records = []
+    with open_recording(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record['at'])
+    return records[:limit] if limit else records
+
+
+def update_kind(update: Update) -> str:
+    """Label for latency grouping: command, button text or callback action"""
+    if update.message and update.message.text:
+        text = update.message.text
+        if text.startswith('/'):
+            return text.split()[0]
+        return 'message:text' if set(text) == {'x'} else text
+    if update.callback_query and update.callback_query.data:
+        return 'callback:' + update.callback_query.data.partition(':')[0]
+    return update.event_type
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Count and latency distribution in milliseconds"""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        'p50_ms': round(percentile(values, 0.5) * 1000, 2),
+        'p90_ms': round(percentile(values, 0.9) * 1000, 2),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+async def replay(records: List[Dict[str, Any]], speed: Optional[float], api_latency: float,
+                 concurrency: int, database: Optional[Path], workdir: Path) -> Dict[str, Any]:
+    """Feed records through the dispatcher; speed None = as fast as possible"""
+    session = setup_session(StubSession(api_latency))
+    dp, tenant_middleware = create_dispatcher()
+
+    # One stub bot and scratch database per recorded bot
+    bots = {}
+    for number, name in enumerate(sorted({record['bot'] for record in records}), start=1):
+        db_path = workdir / f"{name}.sqlite3"
+        if database:
+            # Consistent copy that includes pages still in the WAL of a running bot
+            create_snapshot(db_path, database)
+        tenant = Tenant(name, f"{number}:replay", config_manager, db_path)
+        with use_tenant(tenant):
+            init_db(db_path)
+            if get_config().get('audience_index', {}).get('enabled', False):
+                load_audience_index(db_path)
+        bot = bots[name] = Bot(token=tenant.token, session=session)
+        tenant_middleware.register(bot.id, tenant)
+
+    latencies = defaultdict(list)
+    errors = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def feed(bot: Bot, update: Update):
+        kind = update_kind(update)
+        async with semaphore:
+            started_at = time.monotonic()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception as e:
+                errors[f"{kind}: {type(e).__name__}"] += 1
+            latencies[kind].append(time.monotonic() - started_at)
+
+    # Same arrival pattern as recorded, compressed by speed
+    tasks = []
+    first_at = records[0]['at'] if records else 0.0
+    started_at = time.monotonic()
+    for record in records:
+        if speed:
+            delay = started_at + (record['at'] - first_at) / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = Update.model_validate(record['update'], context={'bot': bots[record['bot']]})
+        tasks.append(asyncio.create_task(feed(bots[record['bot']], update)))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started_at
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    return {
+        'updates': len(records),
+        'speed': speed or 'max',
+        'elapsed_s': round(elapsed, 3),
+        'updates_per_s': round(len(records) / elapsed, 1) if elapsed else 0.0,
+        'errors': dict(errors),
+        'api_calls': dict(session.calls),
+        'latency': latency_summary(all_latencies),
+        'latency_by_kind': {kind: latency_summary(values) for kind, values in
+                            sorted(latencies.items(), key=lambda item: -len(item[1]))},
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Human-readable report"""
+    lines = [
+        f"Replayed {report['updates']} updates at speed {report['speed']} "
+        f"in {report['elapsed_s']} s ({report['updates_per_s']} updates/s)",
+        f"API calls: {sum(report['api_calls'].values())}, errors: {sum(report['errors'].values())}",
+        "",
+        f"{'kind':<32} {'count':>7} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}",
+    ]
+    rows = [('all', report['latency'])] + list(report['latency_by_kind'].items())
+    for kind, summary in rows:
+        lines.append(f"{kind[:32]:<32} {summary['count']:>7} {summary['mean_ms']:>9} {summary['p50_ms']:>9} "
+                     f"{summary['p90_ms']:>9} {summary['p99_ms']:>9} {summary['max_ms']:>9}")
+    for error, count in report['errors'].items():
+        lines.append(f"error {error}: {count}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded updates and report handler latency (ms)")
+    parser.add_argument('recording', type=Path)
+    parser.add_argument('--speed', default='1',
+                        help="1 = recorded pace, N = N times faster, max = no pauses (default 1)")
+    parser.add_argument('--api-latency', type=float, default=50, help="simulated Bot API latency, ms (default 50)")
+    parser.add_argument('--concurrency', type=int, default=100, help="updates handled at once (default 100)")
+    parser.add_argument('--database', type=Path, help="database to start from (snapshot), empty if not given")
+    parser.add_argument('--limit', type=int, default=0, help="replay only the first N updates")
+    parser.add_argument('--json', action='store_true', help="print report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    speed = None if args.speed == 'max' else float(args.speed)
+    records = load_recording(args.recording, args.limit)
+
+    with tempfile.TemporaryDirectory(prefix='replay-') as workdir:
+        report = asyncio.run(replay(records, speed, args.api_latency / 1000, args.concurrency,
+                                    args.database, Path(workdir)))
+
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
 import os
+import asyncio
+import logging
+import pytz
 import yaml
+from collections.abc import Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
 from pathlib import Path
+from types import MappingProxyType
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Bot configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
@@ -14,10 +24,199 @@ DEMO_MODE = True
 # Load YAML config
 CONFIG_PATH = Path(__file__).parent / "config.yaml"
 
-def load_config():
+# Optional list of bots served by one process; without it a single bot uses BOT_TOKEN and config.yaml
+TENANTS_PATH = Path(__file__).parent / "tenants.yaml"
+
+def load_config(path: Path = CONFIG_PATH):
     """Load configuration from YAML file"""
-    with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
 
-config = load_config()
 
+def _freeze(value):
+    """Turn parsed YAML into read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+SCHEDULE_KEYS = (('invitation_day', 'invitation_time'), ('reminder_1_day', 'reminder_1_time'),
+                 ('reminder_2_day', 'reminder_2_time'))
+
+
+def _check_time(value, where: str):
+    try:
+        datetime.strptime(value, '%H:%M')
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: expected HH:MM, got {value!r}")
+
+
+def validate_config(config):
+    """Raise ValueError if config lacks what handlers and jobs read on every update"""
+    if not isinstance(config, Mapping):
+        raise ValueError(f"expected a mapping, got {type(config).__name__}")
+    for section in ('schedule', 'meeting'):
+        if not isinstance(config.get(section), Mapping):
+            raise ValueError(f"missing section: {section}")
+
+    try:
+        pytz.timezone(config.get('timezone'))
+    except (pytz.UnknownTimeZoneError, AttributeError):
+        raise ValueError(f"timezone: unknown time zone {config.get('timezone')!r}")
+
+    schedule = config['schedule']
+    for day_key, time_key in SCHEDULE_KEYS:
+        day = schedule.get(day_key)
+        if not isinstance(day, str) or day.lower() not in WEEKDAYS + tuple(weekday[:3] for weekday in WEEKDAYS):
+            raise ValueError(f"schedule.{day_key}: unknown day {day!r}")
+        _check_time(schedule.get(time_key), f"schedule.{time_key}")
+    if 'time' in config['meeting']:
+        _check_time(config['meeting']['time'], 'meeting.time')
+
+    for section in ('backup', 'retention'):
+        if isinstance(config.get(section), Mapping) and 'time' in config[section]:
+            _check_time(config[section]['time'], f"{section}.time")
+
+    meetings = config.get('upcoming_meetings', ())
+    if not isinstance(meetings, (list, tuple)):
+        raise ValueError("upcoming_meetings: expected a list")
+    for number, entry in enumerate(meetings, start=1):
+        if not isinstance(entry, Mapping):
+            raise ValueError(f"upcoming_meetings[{number}]: expected a mapping")
+        try:
+            datetime.strptime(entry.get('date'), '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError(f"upcoming_meetings[{number}].date: expected YYYY-MM-DD, got {entry.get('date')!r}")
+        if 'time' in entry:
+            _check_time(entry['time'], f"upcoming_meetings[{number}].time")
+
+    if not isinstance(config.get('admins', ()), (list, tuple)):
+        raise ValueError("admins: expected a list")
+
+
+class ConfigManager:
+    """Holds an immutable config snapshot and reloads it when the file changes"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._mtime = path.stat().st_mtime_ns
+        self._snapshot = _freeze(load_config(path))
+        validate_config(self._snapshot)
+        self._listeners = []
+        self._validators = []
+
+    @property
+    def snapshot(self):
+        """Current config snapshot (read-only, safe to keep for one request)"""
+        return self._snapshot
+
+    def add_validator(self, callback):
+        """Register callback(new) called before a reloaded snapshot is swapped in; raising rejects it"""
+        self._validators.append(callback)
+
+    def add_listener(self, callback):
+        """Register callback(old, new) called after a new snapshot is swapped in"""
+        self._listeners.append(callback)
+
+    async def check_for_changes(self) -> bool:
+        """Reload config if the file mtime changed. Parsing runs off the event loop."""
+        try:
+            mtime = (await asyncio.to_thread(self.path.stat)).st_mtime_ns
+        except OSError as e:
+            logger.error(f"Cannot stat config file {self.path}: {e}")
+            return False
+
+        if mtime == self._mtime:
+            return False
+
+        # Remember the mtime even if parsing fails, so a broken file is not re-parsed every tick
+        self._mtime = mtime
+
+        try:
+            new_snapshot = _freeze(await asyncio.to_thread(load_config, self.path))
+        except (OSError, yaml.YAMLError) as e:
+            logger.error(f"Config reload failed, keeping previous config: {e}")
+            return False
+
+        # An editor saving in place can leave an empty or partial file for a moment
+        try:
+            validate_config(new_snapshot)
+            for callback in self._validators:
+                callback(new_snapshot)
+        except Exception as e:
+            logger.error(f"Invalid config in {self.path}, keeping previous config: {e}")
+            return False
+
+        # Single reference assignment - readers see either the old or the new snapshot
+        old_snapshot, self._snapshot = self._snapshot, new_snapshot
+        logger.info(f"Config reloaded from {self.path}")
+
+        for callback in self._listeners:
+            try:
+                callback(old_snapshot, new_snapshot)
+            except Exception as e:
+                logger.error(f"Config reload listener {callback.__name__} failed: {e}")
+
+        return True
+
+
+config_manager = ConfigManager(CONFIG_PATH)
+
+
+class Tenant:
+    """One bot served by this process: its token, config and database"""
+
+    def __init__(self, name: str, token: str, config_manager: ConfigManager, db_path: Path = None):
+        self.name = name
+        self.token = token
+        self.config_manager = config_manager
+        # None = default database (bot/data/db.sqlite3)
+        self.db_path = db_path
+
+    def __repr__(self):
+        return f"<Tenant(name={self.name})>"
+
+
+default_tenant = Tenant('default', BOT_TOKEN, config_manager)
+
+# Tenant whose config and database are used by the current update or job
+current_tenant: ContextVar[Tenant] = ContextVar('current_tenant', default=default_tenant)
+
+
+@contextmanager
+def use_tenant(tenant: Tenant):
+    """Run the block with given tenant's config and database"""
+    token = current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        current_tenant.reset(token)
+
+
+def load_tenants(path: Path = TENANTS_PATH):
+    """Load tenants from tenants.yaml, or the single default tenant if there is no such file.
+
+    Every entry has `name`, `token_env` (environment variable with the bot token),
+    `config` and `database` paths relative to the project root.
+    """
+    if not path.exists():
+        return [default_tenant]
+
+    tenants = []
+    root = path.parent
+    for entry in load_config(path)['tenants']:
+        tenants.append(Tenant(
+            name=entry['name'],
+            token=os.getenv(entry['token_env']),
+            config_manager=ConfigManager(root / entry['config']),
+            db_path=root / entry['database']
+        ))
+    return tenants
+
+
+def get_config():
+    """Get current config snapshot of the current tenant"""
+    return current_tenant.get().config_manager.snapshot
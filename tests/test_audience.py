@@ -0,0 +1,36 @@
+"""Audience index checks must not lose writes made while they rebuild the index"""
+from bot.data import audience
+from bot.data.audience import AudienceIndex, check_audience_index, get_audience_index, load_audience_index
+from bot.data.database import RegistrationRepository, UserRepository, init_db
+
+MEETING = '2030-01-01'
+
+
+def test_check_keeps_writes_made_during_build(tmp_path, monkeypatch):
+    db_path = tmp_path / "db.sqlite3"
+    init_db(db_path)
+    users = UserRepository(db_path)
+    for tg_id in (1, 2, 3):
+        users.create_user(tg_id)
+        users.update_user(tg_id, is_registered=True)
+    load_audience_index(db_path)
+    # Phantom registration, as left by a rolled-back write, so the check replaces the index
+    get_audience_index(db_path).set_registration(MEETING, True, tg_id=3)
+
+    build = AudienceIndex.build.__func__
+
+    def build_then_register(cls, path):
+        # Commits after the build's snapshot, like a handler during the hourly check
+        index = build(cls, path)
+        RegistrationRepository(db_path).register_by_tg_id(2, MEETING)
+        return index
+
+    monkeypatch.setattr(AudienceIndex, 'build', classmethod(build_then_register))
+    try:
+        differences = check_audience_index(db_path)
+        # Registered during the build: kept; the phantom one: dropped
+        invited = users.get_registered_users_in_timezone(None, exclude_meeting=MEETING)
+        assert differences == {f"meeting:{MEETING}": 1}
+        assert sorted(user.tg_id for user in invited) == [1, 3]
+    finally:
+        audience._indexes.pop(db_path, None)
@@ -0,0 +1,133 @@
+"""Seat counters must never let a meeting overbook"""
+import io
+import sqlite3
+import threading
+
+from bot.data import audience
+from bot.data.audience import get_audience_index, load_audience_index
+from bot.data.database import RegistrationRepository, UserRepository, init_db
+from bot.data.importer import import_csv
+
+MEETING = '2030-01-01'
+CAPACITY = 50
+USERS = 200
+THREADS = 8
+
+
+def _counts(db_path):
+    conn = sqlite3.connect(db_path)
+    registered = conn.execute(
+        "SELECT COUNT(*) FROM registrations WHERE meeting_date = ? AND status = 'registered'", (MEETING,)
+    ).fetchone()[0]
+    waitlisted = conn.execute(
+        "SELECT COUNT(*) FROM registrations WHERE meeting_date = ? AND status = 'waitlisted'", (MEETING,)
+    ).fetchone()[0]
+    taken = conn.execute("SELECT taken FROM meeting_seats WHERE meeting_date = ?", (MEETING,)).fetchone()[0]
+    conn.close()
+    return registered, waitlisted, taken
+
+
+def _database(tmp_path):
+    db_path = tmp_path / "db.sqlite3"
+    init_db(db_path)
+    users = UserRepository(db_path)
+    for tg_id in range(1, USERS + 1):
+        users.create_user(tg_id)
+    return db_path
+
+
+def test_concurrent_registrations_do_not_overbook(tmp_path):
+    db_path = _database(tmp_path)
+    errors = []
+
+    def register(tg_ids):
+        # Own repository per thread, like concurrent handlers
+        repo = RegistrationRepository(db_path)
+        try:
+            for tg_id in tg_ids:
+                repo.register_by_tg_id(tg_id, MEETING, CAPACITY)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=register, args=(range(start, USERS + 1, THREADS),))
+               for start in range(1, THREADS + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    registered, waitlisted, taken = _counts(db_path)
+    assert registered == CAPACITY == taken
+    assert waitlisted == USERS - CAPACITY
+
+
+def test_cancellation_promotes_without_overbooking(tmp_path):
+    db_path = _database(tmp_path)
+    repo = RegistrationRepository(db_path)
+    for tg_id in range(1, CAPACITY + 11):
+        repo.register_by_tg_id(tg_id, MEETING, CAPACITY)
+
+    cancelled, promoted = repo.cancel_registration(1, MEETING)
+
+    assert cancelled and len(promoted) == 1
+    assert _counts(db_path) == (CAPACITY, 9, CAPACITY)
+
+
+def test_create_registration_uses_seat_counter(tmp_path):
+    db_path = _database(tmp_path)
+    repo = RegistrationRepository(db_path)
+    for tg_id in range(1, CAPACITY + 1):
+        repo.register_by_tg_id(tg_id, MEETING, CAPACITY)
+
+    # users.id == tg_id here
+    registration = repo.create_registration(CAPACITY + 1, MEETING)
+
+    assert registration.status == 'waitlisted'
+    assert _counts(db_path) == (CAPACITY, 1, CAPACITY)
+
+
+def test_import_resyncs_seat_counter(tmp_path):
+    db_path = _database(tmp_path)
+    repo = RegistrationRepository(db_path)
+    repo.register_by_tg_id(1, MEETING, CAPACITY)
+
+    rows = ''.join(f"{tg_id},{MEETING}\n" for tg_id in range(2, 11))
+    import_csv(io.StringIO("TG_ID,Meeting Date\n" + rows), db_path=db_path)
+
+    assert _counts(db_path) == (10, 0, 10)
+
+
+def test_import_normalizes_dates_and_skips_unknown_statuses(tmp_path):
+    db_path = _database(tmp_path)
+    rows = (f"1,{MEETING} 00:00,registered\n"
+            f"2,01.01.2030,Waitlisted\n"
+            f"3,{MEETING},pending\n"
+            f"4,someday,registered\n")
+    report = import_csv(io.StringIO("TG_ID,Meeting Date,Status\n" + rows), db_path=db_path)
+
+    conn = sqlite3.connect(db_path)
+    stored = conn.execute("SELECT user_id, meeting_date, status FROM registrations ORDER BY user_id").fetchall()
+    conn.close()
+    assert stored == [(1, MEETING, 'registered'), (2, MEETING, 'waitlisted')]
+    assert report.skipped_count == 2
+
+
+def test_capacity_increase_promotes_waitlist(tmp_path):
+    db_path = _database(tmp_path)
+    repo = RegistrationRepository(db_path)
+    for tg_id in (1, 2, 3):
+        repo.register_by_tg_id(tg_id, MEETING, 1)
+    load_audience_index(db_path)
+
+    try:
+        registration = repo.register_by_tg_id(4, MEETING, 4)
+        index = get_audience_index(db_path)
+        in_index = sorted(index.tg_ids_of(index.meetings[MEETING]))
+    finally:
+        audience._indexes.pop(db_path, None)
+
+    assert registration.status == 'registered'
+    assert registration.promoted == [2, 3]
+    assert in_index == [1, 2, 3, 4]
+    assert _counts(db_path) == (4, 0, 4)
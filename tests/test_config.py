@@ -0,0 +1,28 @@
+"""Config reload must keep the previous snapshot when the new file is unusable"""
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from config import CONFIG_PATH, ConfigManager
+
+
+@pytest.mark.parametrize('content', [
+    '',
+    'timezone: "Europe/Moscow"\n',
+    CONFIG_PATH.read_text(encoding='utf-8').replace('"10:40"', '"25:00"'),
+    CONFIG_PATH.read_text(encoding='utf-8').replace('"2025-12-18"', '"2025-12-18 00:00"'),
+])
+def test_invalid_reload_keeps_previous_snapshot(tmp_path, content):
+    path = tmp_path / "config.yaml"
+    shutil.copyfile(CONFIG_PATH, path)
+    manager = ConfigManager(path)
+    previous = manager.snapshot
+
+    path.write_text(content, encoding='utf-8')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert not asyncio.run(manager.check_for_changes())
+    assert manager.snapshot is previous
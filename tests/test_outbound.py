@@ -0,0 +1,67 @@
+"""Interactive replies keep low latency while a broadcast saturates the rate budget"""
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+
+from bot.middlewares.outbound import OutboundScheduler, SendPriority, send_priority
+
+API_LATENCY = 0.005
+RATE = 200
+BROADCAST_SIZE = 400
+INTERACTIVE_COUNT = 40
+
+
+class FakeApiSession(BaseSession):
+    """Local fake Bot API: every call succeeds after a fixed delay"""
+
+    async def make_request(self, bot, method, timeout=None):
+        await asyncio.sleep(API_LATENCY)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def _p99(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(0.99 * len(values)))]
+
+
+async def _run():
+    session = FakeApiSession()
+    session.middleware(OutboundScheduler(rate=RATE, burst=20, reserve=5))
+    bot = Bot(token="42:TEST", session=session)
+
+    async def timed_send(chat_id):
+        started_at = time.monotonic()
+        await bot.send_chat_action(chat_id=chat_id, action='typing')
+        return time.monotonic() - started_at
+
+    async def run_broadcast():
+        with send_priority(SendPriority.INVITATION):
+            return await asyncio.gather(*(timed_send(chat_id) for chat_id in range(BROADCAST_SIZE)))
+
+    async def run_interactive():
+        latencies = []
+        # Let the broadcast fill the queue first
+        await asyncio.sleep(0.1)
+        for _ in range(INTERACTIVE_COUNT):
+            latencies.append(await timed_send(1))
+            await asyncio.sleep(0.02)
+        return latencies
+
+    return await asyncio.gather(run_broadcast(), run_interactive())
+
+
+def test_interactive_p99_stays_low_during_broadcast():
+    broadcast_latencies, interactive_latencies = asyncio.run(_run())
+
+    # The broadcast really saturated the budget: its tail waited for well over a second
+    assert max(broadcast_latencies) > BROADCAST_SIZE / RATE * 0.8
+    # Interactive replies wait at most about one token interval plus the API call
+    assert _p99(interactive_latencies) < 0.05